@@ -1,14 +1,38 @@
+from functools import cache
 from pathlib import Path
 from typing import Optional
 
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent, ModelMessage
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.usage import RunUsage
 
+from journal import JOURNAL, SESSIONS_DIR, Journal, checkpoint
 from prompts import PLANNING_PROMPT
-from tools import edit, execute, glob_files, read, search, write
+from ratelimit import rate_limited
+from tools import (
+    edit,
+    execute,
+    feature_status,
+    find_definition,
+    find_references,
+    glob_files,
+    mark_feature,
+    next_feature,
+    read,
+    repo_map,
+    search,
+    set_feature_test,
+    verify_features,
+    write,
+)
+from usage import UsageTracker
+
+AGENT_MODEL = "openai:gpt-5-mini"
+PLANNING_MODEL = "google-gla:gemini-3-flash-preview"
 
 _agent = Agent(
-    model="openai:gpt-5-mini",
+    model=rate_limited(AGENT_MODEL),
     tools=[
         read,
         search,
@@ -16,7 +40,16 @@ _agent = Agent(
         write,
         execute,
         glob_files,
+        repo_map,
+        find_definition,
+        find_references,
+        feature_status,
+        next_feature,
+        mark_feature,
+        set_feature_test,
+        verify_features,
     ],
+    history_processors=[checkpoint],
 )
 
 
@@ -85,22 +118,46 @@ def planning_response_to_markdown(plan: PlanningResponse) -> str:
     return md
 
 
+@cache
+def _planning_agent() -> Agent:
+    # Created on first use and shared by every planning session
+    return Agent(
+        model=rate_limited(PLANNING_MODEL),
+        instructions=PLANNING_PROMPT,
+        output_type=PlanningResponse | QuestionResponse,
+        history_processors=[checkpoint],
+    )
+
+
 async def planning_step(
-    user_prompt: str, message_history: list[ModelMessage], project_dir: Path
+    user_prompt: str,
+    message_history: list[ModelMessage],
+    project_dir: Path,
+    tracker: Optional[UsageTracker] = None,
 ):
     if not project_dir.exists():
         project_dir.mkdir(parents=True)
 
-    agent = Agent(
-        model="google-gla:gemini-3-flash-preview",
-        instructions=PLANNING_PROMPT,
-        output_type=PlanningResponse | QuestionResponse,
-    )
-
-    response = await agent.run(
-        user_prompt + "\nHere is the project directory: " + str(project_dir),
-        message_history=message_history,
-    )
+    if tracker is not None:
+        tracker.check()
+
+    limits = tracker.usage_limits(PLANNING_MODEL) if tracker is not None else None
+    run_usage = RunUsage()
+    try:
+        response = await _planning_agent().run(
+            user_prompt + "\nHere is the project directory: " + str(project_dir),
+            message_history=message_history,
+            usage_limits=limits,
+            usage=run_usage,
+        )
+    except UsageLimitExceeded:
+        # Charge what the stopped run used so the budget carries over
+        if tracker is not None:
+            tracker.record_stopped(PLANNING_MODEL, run_usage, limits)
+        raise
+    if tracker is not None:
+        tracker.record(PLANNING_MODEL, response.usage())
+    checkpoint(response.all_messages())
     output = response.output
     print(output)
 
@@ -117,20 +174,33 @@ async def planning_step(
 
 if __name__ == "__main__":
     import asyncio
+    import sys
+    import time
 
     async def main():
         project_dir = Path("project")
         user_prompt = (
             "create a todo to build an rl environment to simulate tool calling in llms"
         )
-        messages = []
+        # `python agent.py <session>` resumes a previous planning session
+        name = sys.argv[1] if len(sys.argv) > 1 else time.strftime("%Y%m%d-%H%M%S")
+        journal = Journal(SESSIONS_DIR / name)
+        JOURNAL.set(journal)
+        messages = list(journal.messages)
+        tracker = UsageTracker()
+        print(f"Session: {name}")
+        if messages:
+            print(f"Resumed {len(messages)} messages.")
+            user_prompt = input("You: ").strip()
 
         while True:
             status, *response, new_messages = await planning_step(
-                user_prompt, messages, project_dir
+                user_prompt, messages, project_dir, tracker
             )
             messages.extend(new_messages)
 
+            print(f"Usage: {tracker.summary()}")
+
             if status == "done":
                 print("\n✓ Planning complete!")
                 break
@@ -0,0 +1,258 @@
+import argparse
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tomllib
+from pathlib import Path
+
+# Files whose contents decide which environment a project needs
+FINGERPRINT_FILES = ["pyproject.toml", "uv.lock", "requirements.txt", "init.sh"]
+CACHE_DIR = Path.home() / ".cache" / "selfheal" / "venvs"
+READY_MARKER = ".selfheal-ready"
+# In a project's own .venv layered on a cached one; holds the cached venv's path
+OVERLAY_MARKER = ".selfheal-overlay"
+
+
+def fingerprint(project_dir: Path) -> str:
+    """Hash of what decides `project_dir`'s environment (also used by init.sh)."""
+    digest = hashlib.sha256(sys.version.encode())
+    for name in FINGERPRINT_FILES:
+        path = project_dir / name
+        if path.exists():
+            digest.update(name.encode() + b"\0" + path.read_bytes() + b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _dependencies(project_dir: Path) -> list[str]:
+    pyproject = project_dir / "pyproject.toml"
+    if not pyproject.exists():
+        return []
+    with open(pyproject, "rb") as f:
+        return tomllib.load(f).get("project", {}).get("dependencies", [])
+
+
+def _install_commands(project_dir: Path, venv: Path) -> list[list[str]]:
+    # Only dependencies are installed: the venv is shared by every worktree
+    # with the same fingerprint, so the project itself is installed into each
+    # worktree's overlay (see overlay_environment).
+    python = str(venv / "bin" / "python")
+    uv = shutil.which("uv")
+    if uv and (project_dir / "uv.lock").exists():
+        return [[uv, "sync", "--frozen", "--no-install-project"]]
+
+    commands = [
+        [uv, "venv", str(venv)] if uv else [sys.executable, "-m", "venv", str(venv)]
+    ]
+    pip = (
+        [uv, "pip", "install", "--python", python]
+        if uv
+        else [python, "-m", "pip", "install"]
+    )
+    if (project_dir / "requirements.txt").exists():
+        commands.append(pip + ["-r", str(project_dir / "requirements.txt")])
+    dependencies = _dependencies(project_dir)
+    if dependencies:
+        commands.append(pip + dependencies)
+    return commands
+
+
+def ensure_environment(project_dir: Path) -> tuple[Path, str]:
+    """Make sure the cached venv for `project_dir`'s fingerprint exists.
+
+    Returns (venv path, what was done). Concurrent callers with the same
+    fingerprint wait for one build instead of building twice.
+    """
+    venv = CACHE_DIR / fingerprint(project_dir)
+    if (venv / READY_MARKER).exists():
+        return venv, "skipped (cached environment)"
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(venv.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if (venv / READY_MARKER).exists():
+            return venv, "skipped (built by another session)"
+
+        start = time.perf_counter()
+        shutil.rmtree(venv, ignore_errors=True)
+        env = {**os.environ, "UV_PROJECT_ENVIRONMENT": str(venv)}
+        for command in _install_commands(project_dir, venv):
+            result = subprocess.run(
+                command, cwd=project_dir, env=env, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"{' '.join(command)} failed:\n{result.stderr or result.stdout}"
+                )
+        (venv / READY_MARKER).write_text(str(project_dir))
+        return venv, f"installed in {time.perf_counter() - start:.1f}s"
+
+
+def _site_packages(venv: Path) -> Path:
+    return next(venv.glob("lib/python*/site-packages"))
+
+
+def _project_install_command(project_dir: Path, venv: Path, overlay: Path):
+    python = str(overlay / "bin" / "python")
+    uv = shutil.which("uv")
+    if uv:
+        return [uv, "pip", "install", "--python", python, "--no-deps", "-e", "."]
+    pip = [str(venv / "bin" / "python"), "-m", "pip", "--python", python]
+    return pip + ["install", "--no-deps", "-e", "."]
+
+
+def overlay_environment(project_dir: Path, venv: Path) -> str:
+    """Give the project its own .venv layered on the cached `venv`.
+
+    The cached venv holds dependencies only and is shared by every worktree
+    with the same fingerprint. The overlay sees it through a .pth file and
+    gets the project itself installed editable (with its console scripts),
+    so each worktree imports its own sources. Returns what was done.
+    """
+    overlay = project_dir / ".venv"
+    marker = overlay / OVERLAY_MARKER
+    if overlay.is_symlink():
+        overlay.unlink()
+    elif overlay.exists() and not marker.exists():
+        # A real environment the user made; leave it alone
+        return "skipped (project has its own .venv)"
+    elif marker.exists() and marker.read_text() == str(venv):
+        return "skipped (up to date)"
+
+    start = time.perf_counter()
+    shutil.rmtree(overlay, ignore_errors=True)
+    subprocess.run(
+        [str(venv / "bin" / "python"), "-m", "venv", "--without-pip", str(overlay)],
+        check=True,
+        capture_output=True,
+    )
+    (_site_packages(overlay) / "selfheal-base.pth").write_text(
+        f"{_site_packages(venv)}\n"
+    )
+    report = "no project to install"
+    if (project_dir / "pyproject.toml").exists() or (project_dir / "setup.py").exists():
+        result = subprocess.run(
+            _project_install_command(project_dir, venv, overlay),
+            cwd=project_dir,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode == 0:
+            report = "installed editable"
+        else:
+            # Sources stay importable through PYTHONPATH (see below)
+            output = (result.stderr or result.stdout).strip().splitlines()
+            report = f"install failed: {output[-1] if output else result.returncode}"
+    marker.write_text(str(venv))
+    return f"{report} in {time.perf_counter() - start:.1f}s"
+
+
+def environment_variables(
+    venv: Path, project_dir: Path | None = None
+) -> dict[str, str]:
+    """Variables that activate `venv` and tell init.sh dependencies are ready.
+
+    With `project_dir`, its overlay .venv is activated instead, and the
+    project and its src/ are put on PYTHONPATH in case its own install
+    failed.
+    """
+    bins = [venv / "bin"]
+    variables = {"VIRTUAL_ENV": str(venv), "SELFHEAL_DEPS_READY": "1"}
+    if project_dir is not None:
+        overlay = project_dir / ".venv"
+        if (overlay / OVERLAY_MARKER).exists():
+            bins.insert(0, overlay / "bin")
+            variables["VIRTUAL_ENV"] = str(overlay)
+        paths = [project_dir]
+        if (project_dir / "src").is_dir():
+            paths.append(project_dir / "src")
+        variables["PYTHONPATH"] = os.pathsep.join(
+            [str(path) for path in paths]
+            + ([os.environ["PYTHONPATH"]] if os.environ.get("PYTHONPATH") else [])
+        )
+    variables["PATH"] = os.pathsep.join(
+        [str(path) for path in bins] + [os.environ.get("PATH", "")]
+    )
+    return variables
+
+
+def _run_init_script(project_dir: Path, env: dict[str, str]) -> str:
+    script = project_dir / "init.sh"
+    if not script.exists():
+        return "skipped (no init.sh)"
+    start = time.perf_counter()
+    result = subprocess.run(
+        ["bash", str(script)],
+        cwd=project_dir,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"init.sh failed:\n{result.stderr or result.stdout}")
+    return f"ran in {time.perf_counter() - start:.1f}s"
+
+
+def bootstrap(project_dir: Path, run_init: bool = True) -> dict[str, str]:
+    """Set up `project_dir`'s environment, skipping whatever is up to date.
+
+    Dependencies go into the cached venv first and the project into its own
+    overlay .venv, then init.sh runs with that active and told to skip its
+    own install. Returns a report of each step.
+    """
+    project_dir = project_dir.resolve()
+    venv, deps_report = ensure_environment(project_dir)
+    project_report = overlay_environment(project_dir, venv)
+    if run_init:
+        init_report = _run_init_script(
+            project_dir, environment_variables(venv, project_dir)
+        )
+    else:
+        init_report = "skipped"
+
+    return {
+        "fingerprint": venv.name,
+        "dependencies": deps_report,
+        "project": project_report,
+        "init.sh": init_report,
+        "venv": str(venv),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="bootstrap",
+        description="Set up a project environment, reusing cached installs.",
+    )
+    parser.add_argument("project_dir", nargs="?", type=Path, default=Path("."))
+    parser.add_argument(
+        "--no-init", action="store_true", help="Don't run the project's init.sh."
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="Only print the project's environment fingerprint.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.fingerprint:
+        print(fingerprint(args.project_dir))
+        return 0
+
+    start = time.perf_counter()
+    try:
+        report = bootstrap(args.project_dir, run_init=not args.no_init)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    for step, result in report.items():
+        print(f"{step}: {result}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
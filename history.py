@@ -0,0 +1,189 @@
+import bisect
+import math
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from prompt_toolkit.history import History
+
+HISTORY_PATH = Path.home() / ".selfheal" / "history.sqlite3"
+
+# Frecency half-life: a use this long ago counts half as much as one now.
+HALF_LIFE = 7 * 24 * 3600
+# New prompts kept outside the tree until this many have accumulated
+MAX_PENDING = 512
+
+
+def _bump(log_score: float, timestamp: float) -> float:
+    """Add one use at `timestamp` to a log-space frecency score."""
+    weight = timestamp / HALF_LIFE * math.log(2)
+    if log_score == -math.inf:
+        return weight
+    hi, lo = max(log_score, weight), min(log_score, weight)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+class PromptIndex:
+    """Sorted list of prompts with a max segment tree over their scores.
+
+    Entries starting with a prefix form a contiguous range found by
+    bisection, and the tree finds the best of the range in O(log n). New
+    prompts go to a small sorted side list that lookups scan, and are
+    merged into the tree once MAX_PENDING of them have accumulated.
+    """
+
+    def __init__(self):
+        self._scores: dict[str, float] = {}
+        # Indexed entries, their scores, and their positions by text
+        self._texts: list[str] = []
+        self._values: list[float] = []
+        self._positions: dict[str, int] = {}
+        # Node -> position of the best entry below it; leaves start at len
+        self._tree: list[int] = []
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def load(self, entries: Iterable[tuple[str, float]]) -> None:
+        """Add many entries at once, keeping any added meanwhile."""
+        scores = dict(entries)
+        with self._lock:
+            for text, log_score in self._scores.items():
+                scores[text] = max(log_score, scores.get(text, -math.inf))
+            self._scores = scores
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._texts = sorted(self._scores)
+        self._values = [self._scores[text] for text in self._texts]
+        self._positions = {text: i for i, text in enumerate(self._texts)}
+        n = len(self._texts)
+        self._tree = [0] * n + list(range(n))
+        for node in range(n - 1, 0, -1):
+            self._tree[node] = self._better(
+                self._tree[2 * node], self._tree[2 * node + 1]
+            )
+        self._pending = []
+
+    def _better(self, a: int, b: int) -> int:
+        # Ties go to the alphabetically first entry; -1 is no entry
+        if a < 0:
+            return b
+        if self._values[a] > self._values[b] or (
+            self._values[a] == self._values[b] and a < b
+        ):
+            return a
+        return b
+
+    def add(self, text: str, log_score: float) -> None:
+        with self._lock:
+            previous = self._scores.get(text, -math.inf)
+            self._scores[text] = log_score = max(log_score, previous)
+            position = self._positions.get(text)
+            if position is not None:
+                self._values[position] = log_score
+                node = (position + len(self._texts)) // 2
+                while node:
+                    self._tree[node] = self._better(
+                        self._tree[2 * node], self._tree[2 * node + 1]
+                    )
+                    node //= 2
+            elif previous == -math.inf:
+                bisect.insort(self._pending, text)
+                if len(self._pending) >= MAX_PENDING:
+                    self._rebuild()
+
+    def best(self, prefix: str) -> str | None:
+        """Return the highest-ranked entry starting with `prefix`, if any."""
+        # Every string starting with `prefix` sorts before this one
+        upper = prefix + chr(0x10FFFF)
+        with self._lock:
+            best, best_score = None, -math.inf
+            n = len(self._texts)
+            low = bisect.bisect_left(self._texts, prefix) + n
+            high = bisect.bisect_left(self._texts, upper) + n
+            found = -1
+            while low < high:
+                if low & 1:
+                    found = self._better(found, self._tree[low])
+                    low += 1
+                if high & 1:
+                    high -= 1
+                    found = self._better(found, self._tree[high])
+                low //= 2
+                high //= 2
+            if found >= 0:
+                best, best_score = self._texts[found], self._values[found]
+            start = bisect.bisect_left(self._pending, prefix)
+            end = bisect.bisect_left(self._pending, upper)
+            for text in self._pending[start:end]:
+                score = self._scores[text]
+                if score > best_score or (score == best_score and text < best):
+                    best, best_score = text, score
+            return best
+
+
+class PersistentHistory(History):
+    """Prompt history stored in SQLite, indexed in a background thread.
+
+    Each distinct prompt is stored once with its use count and frecency
+    score; the index is ready shortly after startup and suggestions are
+    simply unavailable until then. Wrap it in prompt_toolkit's
+    ThreadedHistory so the strings for history navigation load lazily too.
+    """
+
+    def __init__(self, path: Path = HISTORY_PATH):
+        super().__init__()
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index = PromptIndex()
+        self._ready = threading.Event()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " text TEXT PRIMARY KEY,"
+                " count INTEGER NOT NULL,"
+                " score REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+        threading.Thread(target=self._build_index, daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _build_index(self) -> None:
+        with self._connect() as db:
+            self.index.load(db.execute("SELECT text, score FROM history"))
+        self._ready.set()
+
+    def suggest(self, prefix: str) -> str | None:
+        if not prefix or not self._ready.is_set():
+            return None
+        return self.index.best(prefix)
+
+    def load_history_strings(self) -> Iterable[str]:
+        # Most recent first, as prompt_toolkit expects
+        with self._connect() as db:
+            rows = db.execute("SELECT text FROM history ORDER BY last_used DESC")
+            yield from (text for (text,) in rows)
+
+    def store_string(self, string: str) -> None:
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT score FROM history WHERE text = ?", (string,)
+            ).fetchone()
+            score = _bump(row[0] if row else -math.inf, now)
+            db.execute(
+                "INSERT INTO history (text, count, score, last_used)"
+                " VALUES (?, 1, ?, ?)"
+                " ON CONFLICT(text) DO UPDATE SET"
+                " count = count + 1, score = excluded.score,"
+                " last_used = excluded.last_used",
+                (string, score, now),
+            )
+        self.index.add(string, score)
@@ -5,28 +5,45 @@ set -e
 
 echo "Setting up the Tool-Calling RL Environment..."
 
-# 1. Install Python dependencies
-if [ -f "pyproject.toml" ]; then
-    echo "Installing dependencies from pyproject.toml..."
-    pip install .
-else
-    echo "Installing core dependencies..."
-    pip install gymnasium langchain pydantic docker pytest streamlit
-fi
+# 1. Directories, then the Docker check in the background
+mkdir -p data/scenarios logs tests
+(
+    if command -v docker &> /dev/null; then
+        echo "Docker is installed. You can use 'docker build' for containerized runs."
+    else
+        echo "Warning: Docker not found. Containerized features will not be available."
+    fi
+) &
+DOCKER_CHECK=$!
 
-# 2. Check for Docker
-if command -v docker &> /dev/null; then
-    echo "Docker is installed. You can use 'docker build' for containerized runs."
+# 2. Install Python dependencies, unless nothing changed since the last install.
+# The project itself is installed in editable mode, so skipping the install
+# never leaves a stale copy of its sources in site-packages. The fingerprint
+# is the one bootstrap.py uses for its cached environments.
+FINGERPRINT_FILE=".selfheal/deps-fingerprint"
+FINGERPRINT=$(python "$(dirname "$0")/bootstrap.py" --fingerprint .)
+if [ -n "$SELFHEAL_DEPS_READY" ]; then
+    echo "Skipping dependency install: provided by bootstrap.py (project installed editable)."
+elif [ -f "$FINGERPRINT_FILE" ] && [ "$(cat "$FINGERPRINT_FILE")" = "$FINGERPRINT" ]; then
+    echo "Skipping dependency install: environment fingerprint unchanged."
 else
-    echo "Warning: Docker not found. Containerized features will not be available."
+    if [ -f "pyproject.toml" ]; then
+        echo "Installing dependencies from pyproject.toml..."
+        pip install -e .
+    else
+        echo "Installing core dependencies..."
+        pip install gymnasium langchain pydantic docker pytest streamlit
+    fi
+    mkdir -p "$(dirname "$FINGERPRINT_FILE")"
+    # Local state; keep it out of `git add .`
+    [ -f .selfheal/.gitignore ] || echo '*' > .selfheal/.gitignore
+    echo "$FINGERPRINT" > "$FINGERPRINT_FILE"
 fi
 
-# 3. Create necessary directories
-mkdir -p data/scenarios
-mkdir -p logs
-mkdir -p tests
+# Status of the background check, which `set -e` does not cover
+wait "$DOCKER_CHECK"
 
-# 4. Print helpful information
+# 3. Print helpful information
 echo "--------------------------------------------------"
 echo "Setup Complete!"
 echo "To run the environment locally: python main.py"
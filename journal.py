@@ -0,0 +1,145 @@
+import os
+import struct
+import threading
+import zlib
+from contextvars import ContextVar
+from pathlib import Path
+
+from pydantic_ai import ModelMessage
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+from state import STATE_DIR, make_state_dir
+
+# Record framing: payload length and CRC32, then the zlib-compressed payload
+HEADER = struct.Struct("<II")
+GENERATION = struct.Struct("<Q")
+SNAPSHOT_EVERY = 64
+# Per-session state (journal, usage, ...) is stored under here
+SESSIONS_DIR = Path(STATE_DIR) / "sessions"
+
+
+def _frame(payload: bytes) -> bytes:
+    data = zlib.compress(payload, 1)
+    return HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def _read_frames(path: Path) -> tuple[list[bytes], int]:
+    """Decoded payloads of all intact records and the offset after the last.
+
+    A torn or corrupt record (from a crash mid-write) ends the log.
+    """
+    payloads, offset = [], 0
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return payloads, 0
+    while offset + HEADER.size <= len(data):
+        length, crc = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        chunk = data[start : start + length]
+        if len(chunk) < length or zlib.crc32(chunk) != crc:
+            break
+        payloads.append(zlib.decompress(chunk))
+        offset = start + length
+    return payloads, offset
+
+
+class Journal:
+    """Append-only, crash-safe log of a session's messages.
+
+    Each message is appended as its own compressed, checksummed record as
+    soon as it is complete. Every SNAPSHOT_EVERY records, the full history
+    is written to a snapshot and a new journal generation starts, so
+    resuming reads one snapshot plus a bounded tail. Appends are flushed to
+    the OS (surviving a killed process) but only snapshots are fsynced.
+    """
+
+    def __init__(self, directory: Path, snapshot_every: int = SNAPSHOT_EVERY):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        make_state_dir(self.directory)
+        self._lock = threading.Lock()
+        self.messages: list[ModelMessage] = self._load()
+        self._file = open(self._journal_path, "ab")
+
+    @property
+    def _snapshot_path(self) -> Path:
+        return self.directory / "snapshot.bin"
+
+    @property
+    def _journal_path(self) -> Path:
+        return self.directory / f"journal.{self.generation}.bin"
+
+    def _load(self) -> list[ModelMessage]:
+        self.generation, messages = 0, []
+        payloads, _ = _read_frames(self._snapshot_path)
+        if payloads:
+            (self.generation,) = GENERATION.unpack_from(payloads[0])
+            messages = ModelMessagesTypeAdapter.validate_json(
+                payloads[0][GENERATION.size :]
+            )
+        payloads, end = _read_frames(self._journal_path)
+        for payload in payloads:
+            messages.extend(ModelMessagesTypeAdapter.validate_json(payload))
+        # Drop a torn tail so new records follow intact ones
+        if self._journal_path.exists() and end < self._journal_path.stat().st_size:
+            with open(self._journal_path, "r+b") as f:
+                f.truncate(end)
+        self._tail = len(payloads)
+        return messages
+
+    def record(self, messages: list[ModelMessage]) -> None:
+        """Persist whatever `messages` has beyond what was recorded so far.
+
+        `messages` is the session's full history. If it no longer extends
+        the recorded one (e.g. after a reset), it replaces it.
+        """
+        with self._lock:
+            count = len(self.messages)
+            if len(messages) < count or messages[:count] != self.messages:
+                self._snapshot(list(messages))
+                return
+            for message in messages[count:]:
+                self._file.write(_frame(ModelMessagesTypeAdapter.dump_json([message])))
+                self.messages.append(message)
+                self._tail += 1
+            self._file.flush()
+            if self._tail >= self.snapshot_every:
+                self._snapshot(self.messages)
+
+    def _snapshot(self, messages: list[ModelMessage]) -> None:
+        old_journal = self._journal_path
+        generation = self.generation + 1
+        payload = GENERATION.pack(generation) + ModelMessagesTypeAdapter.dump_json(
+            messages
+        )
+        tmp = self._snapshot_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_frame(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._snapshot_path)
+
+        self._file.close()
+        self.generation, self.messages, self._tail = generation, messages, 0
+        self._file = open(self._journal_path, "ab")
+        old_journal.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+# Journal of the session whose agent run is in progress, if any
+JOURNAL: ContextVar[Journal | None] = ContextVar("journal", default=None)
+
+
+def checkpoint(messages: list[ModelMessage]) -> list[ModelMessage]:
+    """History processor recording each message before the next model request.
+
+    By then every earlier model response and tool result is complete.
+    """
+    journal = JOURNAL.get()
+    if journal is not None:
+        journal.record(messages)
+    return messages
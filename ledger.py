@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+FEATURE_LIST = "feature_list.json"
+
+
+class FeatureLedger:
+    """Indexed view of feature_list.json.
+
+    Status queries are answered from in-memory indexes. The only write
+    allowed is flipping a feature's "passes" flag, and the file is replaced
+    atomically so concurrent readers never see a partial write. Ledgers are
+    shared between sessions, so reloading and queries hold a lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self) -> None:
+        with self._lock:
+            with open(self.path) as f:
+                self.features: list[dict] = json.load(f)
+            stat = self.path.stat()
+            self._stamp = (stat.st_mtime_ns, stat.st_size)
+            self._failing = [
+                i
+                for i, feature in enumerate(self.features)
+                if not feature.get("passes")
+            ]
+            self._counts: dict[str, dict[str, int]] = {}
+            for feature in self.features:
+                category = self._counts.setdefault(
+                    feature.get("category", "uncategorized"),
+                    {"passing": 0, "failing": 0},
+                )
+                category["passing" if feature.get("passes") else "failing"] += 1
+
+    def refresh(self) -> None:
+        """Reload if the file changed on disk since it was indexed."""
+        with self._lock:
+            stat = self.path.stat()
+            if (stat.st_mtime_ns, stat.st_size) != self._stamp:
+                self._load()
+
+    def counts(self) -> dict:
+        with self._lock:
+            passing = sum(c["passing"] for c in self._counts.values())
+            return {
+                "total": len(self.features),
+                "passing": passing,
+                "failing": len(self.features) - passing,
+                "by_category": self._counts,
+            }
+
+    def next_failing(self, category: str | None = None) -> int | None:
+        """Index of the highest-priority feature that does not pass yet."""
+        with self._lock:
+            for i in self._failing:
+                if category is None or self.features[i].get("category") == category:
+                    return i
+            return None
+
+    def set_passes(self, index: int, passes: bool = True) -> None:
+        with self._lock:
+            self.refresh()
+            if not 0 <= index < len(self.features):
+                raise IndexError(f"No feature #{index}")
+            if self.features[index].get("passes") == passes:
+                return
+            self.features[index]["passes"] = passes
+
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".feature_list.")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.features, f, indent=2)
+                    f.write("\n")
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._load()
+
+
+_ledgers: dict[Path, FeatureLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(project_dir: Path = Path(".")) -> FeatureLedger:
+    """Return the cached ledger for `project_dir`, reloading it if stale."""
+    path = (project_dir / FEATURE_LIST).resolve()
+    with _ledgers_lock:
+        ledger = _ledgers.get(path)
+        if ledger is None:
+            ledger = _ledgers[path] = FeatureLedger(path)
+            return ledger
+    ledger.refresh()
+    return ledger
@@ -8,17 +8,27 @@ from collections.abc import Sequence
 
 import argcomplete
 from prompt_toolkit import PromptSession
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory, Suggestion
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.document import Document
+from prompt_toolkit.history import ThreadedHistory
 from prompt_toolkit.styles import Style as PStyle
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.usage import RunUsage
 from rich.console import Console
 from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
 
-from agent import _agent
+import tools
+from agent import AGENT_MODEL, _agent
+from history import PersistentHistory
+from journal import JOURNAL, SESSIONS_DIR, Journal, checkpoint
+from memo import MEMO
+from prefetch import PREFETCHER
+from sandbox import Limits
+from usage import Budget, BudgetExceeded, UsageTracker
 
 # Setup Rich Console
 console = Console()
@@ -47,24 +57,35 @@ AVAILABLE_MODELS = [
 completer = WordCompleter(list(COMMANDS.keys()), ignore_case=True)
 
 
-class CustomAutoSuggest(AutoSuggestFromHistory):
-    """Auto-suggester combining history with slash command suggestions."""
+class CustomAutoSuggest(AutoSuggest):
+    """Auto-suggester combining indexed history with slash command suggestions."""
 
     def __init__(self, special_suggestions: list[str] | None = None):
         super().__init__()
         self.special_suggestions = special_suggestions or []
 
     def get_suggestion(self, buffer: Buffer, document: Document) -> Suggestion | None:
-        # Try history-based suggestions first
-        suggestion = super().get_suggestion(buffer, document)
-
-        # Check for slash command suggestions
+        # Only suggest while the cursor is on the last line
+        if document.cursor_position_row != document.line_count - 1:
+            return None
         text = document.text_before_cursor.strip()
+        if not text:
+            return None
+
+        # Slash commands take priority over history
         for special in self.special_suggestions:
-            if special.startswith(text) and len(text) > 0:
+            if special.startswith(text):
                 return Suggestion(special[len(text) :])
 
-        return suggestion
+        history = buffer.history
+        if isinstance(history, ThreadedHistory):
+            history = history.history
+        if isinstance(history, PersistentHistory):
+            match = history.suggest(document.text_before_cursor.lstrip())
+            if match is not None:
+                return Suggestion(match[len(document.text_before_cursor.lstrip()) :])
+
+        return None
 
 
 # Custom style for the prompt input (matching Rich's cyan/purple vibe)
@@ -102,6 +123,58 @@ def create_parser(prog_name: str = "selfheal") -> argparse.ArgumentParser:
     )
     model_arg.completer = argcomplete.ChoicesCompleter(AVAILABLE_MODELS)  # type: ignore
 
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION",
+        default=None,
+        help="Continue a previous interactive session from its checkpoint journal.",
+    )
+
+    # Usage budgets
+    parser.add_argument(
+        "--soft-budget",
+        type=float,
+        default=None,
+        help="Warn once the session's estimated cost exceeds this many USD.",
+    )
+    parser.add_argument(
+        "--hard-budget",
+        type=float,
+        default=None,
+        help="Stop the agent once the session's estimated cost exceeds this many USD.",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=None,
+        help="Stop the agent once the session has used this many tokens.",
+    )
+
+    # Sandboxed command execution
+    parser.add_argument(
+        "--sandbox",
+        action="store_true",
+        help="Run agent commands with CPU, memory, file and process limits.",
+    )
+    parser.add_argument(
+        "--sandbox-cpu",
+        type=int,
+        default=Limits.cpu_seconds,
+        help=f"CPU seconds per sandboxed command. Defaults to {Limits.cpu_seconds}.",
+    )
+    parser.add_argument(
+        "--sandbox-memory",
+        type=int,
+        default=Limits.memory_bytes // 1024**2,
+        help="Address space per sandboxed command in MB. Defaults to 2048.",
+    )
+    parser.add_argument(
+        "--sandbox-keep-background",
+        action="store_true",
+        help="Let processes a sandboxed command starts in the background (e.g. dev "
+        "servers) keep running until the session ends.",
+    )
+
     return parser
 
 
@@ -147,12 +220,22 @@ def handle_model_command(command: str, current_model: str, console: Console) ->
         return current_model
 
 
+def panel_title(model: str, tracker: UsageTracker) -> str:
+    color = {"ok": "dim", "warn": "yellow", "stop": "red"}[tracker.status()]
+    return f"[bold purple]{model}[/] [{color}]{tracker.summary()}[/]"
+
+
 async def run_interactive(
     model: str,
     console: Console,
+    budget: Budget | None = None,
+    resume: str | None = None,
 ) -> int:
     """Run the interactive chat loop.
 
+    Every message is checkpointed to the session's journal as it completes,
+    so `resume` (a session name) picks up where that session stopped.
+
     Returns:
         Exit code (0 for success)
     """
@@ -161,9 +244,41 @@ async def run_interactive(
     # Track mutable model state
     current_model = model
 
+    # Message journal and usage accounting, stored per session
+    session_dir = SESSIONS_DIR / (resume or time.strftime("%Y%m%d-%H%M%S"))
+    if resume and not session_dir.is_dir():
+        console.print(f"[red]✗ No session named {resume} in {SESSIONS_DIR}[/]")
+        return 1
+    journal = Journal(session_dir)
+    JOURNAL.set(journal)
+    messages = list(journal.messages)
+    usage_path = session_dir / "usage.json"
+    if resume and usage_path.exists():
+        tracker = UsageTracker.load(usage_path, budget)
+    else:
+        tracker = UsageTracker(budget=budget or Budget())
+    # File views start empty, also on resume: reads return full contents first
+    tools.VIEWS.set({})
+    if resume:
+        console.print(
+            f"[dim]Resumed session {session_dir.name}: "
+            f"{len(messages)} messages, {tracker.summary()}[/]"
+        )
+    else:
+        console.print(
+            f"[dim]Session {session_dir.name} (continue it later with "
+            f"--resume {session_dir.name})[/]"
+        )
+
     # Create a session to keep history
     auto_suggest = CustomAutoSuggest(list(COMMANDS.keys()))
-    session = PromptSession(completer=completer, style=style, auto_suggest=auto_suggest)
+    session = PromptSession(
+        completer=completer,
+        style=style,
+        auto_suggest=auto_suggest,
+        # Loads the strings for up/down navigation off the event loop
+        history=ThreadedHistory(PersistentHistory()),
+    )
 
     while True:
         try:
@@ -195,6 +310,9 @@ async def run_interactive(
                     continue
 
                 elif cmd == "/reset":
+                    messages = []
+                    journal.record(messages)
+                    tools.VIEWS.set({})
                     console.print("[yellow]↺ Context reset.[/]")
                     time.sleep(0.5)
                     continue
@@ -213,36 +331,86 @@ async def run_interactive(
             if not user_input:
                 continue
 
+            try:
+                tracker.check()
+            except BudgetExceeded as e:
+                console.print(f"[red]✗ {e}[/]")
+                continue
+
             console.print()
 
             # Stream response with panel
             content = ""
-            async with _agent.run_stream(user_input) as stream:
-                with Live(
-                    Panel(
-                        Markdown(content),
-                        title=f"[bold purple]{current_model}[/]",
-                        border_style="purple",
-                    ),
-                    refresh_per_second=15,
-                    console=console,
-                ) as live:
-                    async for text in stream.stream_text(delta=True):
-                        content += text
+            limits = tracker.usage_limits(AGENT_MODEL)
+            run_usage = RunUsage()
+            try:
+                async with _agent.run_stream(
+                    user_input,
+                    message_history=messages,
+                    usage_limits=limits,
+                    usage=run_usage,
+                ) as stream:
+                    with Live(
+                        Panel(
+                            Markdown(content),
+                            title=panel_title(current_model, tracker),
+                            border_style="purple",
+                        ),
+                        refresh_per_second=15,
+                        console=console,
+                    ) as live:
+                        async for text in stream.stream_text(delta=True):
+                            content += text
+                            live.update(
+                                Panel(
+                                    Markdown(content),
+                                    title=panel_title(current_model, tracker),
+                                    border_style="purple",
+                                )
+                            )
+                        tracker.record(AGENT_MODEL, stream.usage())
+                        messages = stream.all_messages()
+                        checkpoint(messages)
                         live.update(
                             Panel(
                                 Markdown(content),
-                                title=f"[bold purple]{current_model}[/]",
+                                title=panel_title(current_model, tracker),
                                 border_style="purple",
                             )
                         )
+            except UsageLimitExceeded as e:
+                console.print(f"[red]✗ Token budget exhausted: {e}[/]")
+                # Charge what the stopped run used so the budget carries over
+                tracker.record_stopped(AGENT_MODEL, run_usage, limits)
+                # Keep what the interrupted run finished
+                messages = list(journal.messages)
+            tracker.save(usage_path)
             console.print()
 
+            if tracker.status() == "warn":
+                console.print(
+                    f"[yellow]⚠ Soft budget exceeded: {tracker.summary()}[/]\n"
+                )
+
         except KeyboardInterrupt:
             break
         except EOFError:
             break
 
+    journal.close()
+
+    stats = PREFETCHER.stats()
+    if stats["prefetched"]:
+        console.print(
+            f"[dim]Prefetch: {stats['prefetched_used']}/{stats['prefetched']} used "
+            f"(precision {stats['precision']:.0%}), "
+            f"{stats['cache_hits']}/{stats['reads']} reads from cache[/]"
+        )
+    for tool, counts in MEMO.stats().items():
+        console.print(
+            f"[dim]{tool}: {counts['hits']}/{counts['calls']} calls memoized "
+            f"({counts['hit_ratio']:.0%})[/]"
+        )
     return 0
 
 
@@ -269,6 +437,13 @@ def cli(args_list: Sequence[str] | None = None, *, prog_name: str = "selfheal")
     # Create console
     console_instance = Console()
 
+    if args.sandbox:
+        tools.SANDBOX = Limits(
+            cpu_seconds=args.sandbox_cpu,
+            memory_bytes=args.sandbox_memory * 1024**2,
+            allow_background=args.sandbox_keep_background,
+        )
+
     # One-shot mode if prompt provided
     if args.prompt:
         console_instance.print(f"\n[dim]Using model: {args.model}[/]\n")
@@ -282,7 +457,14 @@ def cli(args_list: Sequence[str] | None = None, *, prog_name: str = "selfheal")
         return 0
 
     # Interactive mode
-    return asyncio.run(run_interactive(args.model, console_instance))
+    budget = Budget(
+        soft_usd=args.soft_budget,
+        hard_usd=args.hard_budget,
+        hard_tokens=args.max_tokens,
+    )
+    return asyncio.run(
+        run_interactive(args.model, console_instance, budget, resume=args.resume)
+    )
 
 
 def cli_exit(prog_name: str = "selfheal") -> None:
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Hashable
+from pathlib import Path
+from typing import TypeVar
+
+T = TypeVar("T")
+
+MAX_ENTRIES = 256
+# Seconds between checks of a workspace's files for outside changes
+POLL_INTERVAL = 1.0
+IGNORED_DIRS = {".git", ".venv", "venv", "node_modules", "__pycache__", ".selfheal"}
+
+
+def tree_stamp(root: Path, max_depth: int | None = None) -> int:
+    """Order-independent hash of every (path, mtime, size) under `root`.
+
+    Only stats files, so it is much cheaper than re-running a search, and it
+    changes when a file is created, deleted, renamed or modified. With
+    `max_depth`, only that many levels of entries are stamped.
+    """
+    stamp = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+        for name in dirnames:
+            stamp += hash(os.path.join(dirpath, name))
+        if max_depth is not None:
+            depth = len(Path(dirpath).relative_to(root).parts)
+            if depth + 1 >= max_depth:
+                dirnames[:] = []
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamp += hash((path, stat.st_mtime_ns, stat.st_size))
+    return stamp
+
+
+def scope_stamp(path: Path, max_depth: int | None = None) -> int | None:
+    """Stamp of what a result about `path` depends on.
+
+    That is the file itself, or the tree (up to `max_depth` levels) under a
+    directory; None if `path` does not exist.
+    """
+    if max_depth != 0 and path.is_dir():
+        return tree_stamp(path, max_depth)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return hash((stat.st_mtime_ns, stat.st_size))
+
+
+def tracked(root: Path, path: Path) -> bool:
+    """Whether changes to `path` show up in `tree_stamp(root)`.
+
+    Results about other paths (outside the workspace, or in ignored
+    directories such as node_modules) could go stale unnoticed.
+    """
+    root = root.resolve()
+    try:
+        parts = (root / path).resolve().relative_to(root).parts
+    except ValueError:
+        return False
+    return not IGNORED_DIRS.intersection(parts)
+
+
+class ToolMemo:
+    """Memoizes read-only tools on the files they depend on.
+
+    Results are keyed on (workspace, tool, normalized arguments) and kept
+    with the stamp of the call's scope (see `scope_stamp`) and the number of
+    times tools that change files called `bump`. A hit therefore costs one
+    stat for a single-file call, or a walk of just the directory searched.
+
+    `generation` serves callers that depend on the whole workspace (the
+    repo map): it also counts outside changes, found by polling the
+    workspace's file stamps at most every POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[int, object]] = OrderedDict()
+        # Per workspace: [generation, tree stamp, last poll time]
+        self._workspaces: dict[Path, list] = {}
+        # Per workspace: number of `bump` calls
+        self._bumps: dict[Path, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.calls: dict[str, int] = defaultdict(int)
+        self.hits: dict[str, int] = defaultdict(int)
+
+    def bump(self, root: Path) -> None:
+        """Invalidate everything memoized for `root`."""
+        root = root.resolve()
+        with self._lock:
+            self._bumps[root] += 1
+            state = self._workspaces.get(root)
+            if state is not None:
+                state[0] += 1
+                # Re-stamp on the next lookup instead of counting our own change
+                state[2] = 0.0
+
+    def generation(self, root: Path) -> int:
+        root = root.resolve()
+        with self._lock:
+            state = self._workspaces.get(root)
+            if state is not None and time.monotonic() - state[2] < POLL_INTERVAL:
+                return state[0]
+        stamp = tree_stamp(root)
+        with self._lock:
+            state = self._workspaces.setdefault(root, [0, stamp, 0.0])
+            if state[1] != stamp:
+                state[0] += 1
+                state[1] = stamp
+            state[2] = time.monotonic()
+            return state[0]
+
+    def call(
+        self,
+        tool: str,
+        root: Path,
+        args: Hashable,
+        compute: Callable[[], T],
+        scope: Path,
+        max_depth: int | None = None,
+    ) -> T:
+        """Return `compute()`, or its memoized result for the same call.
+
+        `scope` is the file or directory (searched `max_depth` levels deep)
+        the result depends on.
+        """
+        root = root.resolve()
+        # Taken before computing, so changes made meanwhile invalidate it
+        stamp = scope_stamp(scope, max_depth)
+        key = (root, tool, args)
+        with self._lock:
+            self.calls[tool] += 1
+            version = (self._bumps[root], stamp)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits[tool] += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+        result = compute()
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                tool: {
+                    "calls": calls,
+                    "hits": self.hits[tool],
+                    "hit_ratio": round(self.hits[tool] / calls, 3),
+                }
+                for tool, calls in self.calls.items()
+            }
+
+
+MEMO = ToolMemo()
@@ -0,0 +1,430 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from bootstrap import bootstrap, environment_variables
+from ledger import FEATURE_LIST, get_ledger
+from verify import VERIFICATION_FILE, load_mapping, save_mapping
+
+# Notes every coding session appends to (see CODING_PROMPT)
+PROGRESS_FILE = "claude-progress.txt"
+
+
+@dataclass
+class SessionResult:
+    feature: int
+    attempts: int
+    passed: bool
+    log: str = ""
+
+
+async def _run(
+    *args: str, cwd: Path, env: dict[str, str] | None = None
+) -> tuple[int, str]:
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        env={**os.environ, **env} if env else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await process.communicate()
+    return process.returncode, output.decode(errors="replace")
+
+
+async def _git(*args: str, cwd: Path) -> tuple[int, str]:
+    return await _run("git", *args, cwd=cwd)
+
+
+async def _show(commit: str, path: str, cwd: Path) -> str:
+    """Contents of `path` at `commit`, or "" if it did not exist there."""
+    code, output = await _git("show", f"{commit}:{path}", cwd=cwd)
+    return output if code == 0 else ""
+
+
+async def _restore(commit: str, path: str, cwd: Path) -> None:
+    """Put `path` back to its state at `commit`, deleting it if it was absent."""
+    code, _ = await _git("checkout", commit, "--", path, cwd=cwd)
+    if code != 0:
+        (cwd / path).unlink(missing_ok=True)
+
+
+def _dependency_errors(features: list[dict], pending: list[int]) -> dict[int, str]:
+    """Why each pending feature's "depends_on" cannot be satisfied, if it can't.
+
+    Self-references, unknown indexes and cycles among pending features would
+    otherwise leave their features waiting forever.
+    """
+    errors, edges = {}, {}
+    for i in pending:
+        depends_on = features[i].get("depends_on", [])
+        if not isinstance(depends_on, list):
+            errors[i] = f"depends_on is not a list: {depends_on!r}"
+            continue
+        for dependency in depends_on:
+            if dependency == i:
+                errors[i] = "depends on itself"
+            elif not isinstance(dependency, int) or not (
+                0 <= dependency < len(features)
+            ):
+                errors[i] = f"depends on unknown feature {dependency!r}"
+        if i not in errors:
+            # Dependencies that already pass need no waiting
+            edges[i] = [d for d in depends_on if d in pending]
+
+    # Depth-first search; a dependency still on the stack closes a cycle
+    state: dict[int, str] = {}
+
+    def visit(i: int, stack: list[int]) -> None:
+        state[i] = "active"
+        stack.append(i)
+        for dependency in edges.get(i, []):
+            if state.get(dependency) == "active":
+                cycle = stack[stack.index(dependency) :]
+                path = " -> ".join(f"#{c}" for c in cycle + [dependency])
+                for member in cycle:
+                    errors.setdefault(member, f"dependency cycle {path}")
+            elif dependency not in state:
+                visit(dependency, stack)
+        stack.pop()
+        state[i] = "done"
+
+    for i in edges:
+        if i not in state:
+            visit(i, [])
+    return errors
+
+
+def _session_command(kind: str, feature: int | None = None) -> list[str]:
+    command = [sys.executable, str(Path(__file__).resolve()), "session", kind]
+    if feature is not None:
+        command += ["--feature", str(feature)]
+    return command
+
+
+class Orchestrator:
+    """Drive the initializer/coding session loop described in prompts.py.
+
+    The initializer runs once in the project directory. Afterwards every
+    feature in feature_list.json that does not pass yet gets its own coding
+    session, each in a separate git worktree and agent process, with at most
+    `concurrency` sessions running at a time. Finished sessions are merged
+    back one at a time and failed ones are retried.
+
+    Features are assumed independent unless they list the indexes they need
+    in "depends_on"; such a feature starts only after those pass and is
+    skipped if one of them fails. Features whose "depends_on" refers to
+    themselves, unknown features or a cycle fail without a session. Ready
+    features start in list (priority) order.
+
+    Files every session edits are merged by policy rather than by git, so
+    parallel sessions do not conflict on them: the feature's "passes" flag
+    and its registered tests are applied to the project's current
+    feature_list.json and verification.json, and the session's progress
+    notes are appended to claude-progress.txt.
+
+    Usage:
+        python orchestrator.py run <project_dir> [--concurrency 4] [--retries 2]
+    """
+
+    def __init__(self, project_dir: Path, concurrency: int = 4, retries: int = 2):
+        self.project_dir = project_dir.resolve()
+        self.worktrees_dir = (
+            self.project_dir.parent / f".{self.project_dir.name}-worktrees"
+        )
+        self.concurrency = concurrency
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Merges into the project's branch happen one at a time
+        self._merge_lock = asyncio.Lock()
+
+    async def initialize(self) -> None:
+        """Run the initializer session unless feature_list.json already exists.
+
+        Its output is committed as the base of every worktree. An existing
+        project must already have a commit and no uncommitted changes, which
+        sessions would not see and merges could clobber.
+        """
+        initialized = False
+        if not (self.project_dir / FEATURE_LIST).exists():
+            print("Running initializer session...")
+            code, output = await _run(
+                *_session_command("initializer"), cwd=self.project_dir
+            )
+            if code != 0:
+                raise RuntimeError(f"Initializer session failed:\n{output}")
+            initialized = True
+
+        if not (self.project_dir / ".git").exists():
+            await _git("init", cwd=self.project_dir)
+        # Keep per-session local state and the linked venv out of every
+        # worktree's commits
+        exclude = self.project_dir / ".git" / "info" / "exclude"
+        exclude.parent.mkdir(parents=True, exist_ok=True)
+        excluded = exclude.read_text().splitlines() if exclude.exists() else []
+        with open(exclude, "a") as f:
+            for pattern in (".selfheal/", ".venv"):
+                if pattern not in excluded:
+                    f.write(pattern + "\n")
+
+        if not initialized:
+            code, _ = await _git("rev-parse", "--verify", "HEAD", cwd=self.project_dir)
+            if code != 0:
+                raise RuntimeError(
+                    f"{self.project_dir} has no commits; commit the project first"
+                )
+            _, status = await _git("status", "--porcelain", cwd=self.project_dir)
+            if status.strip():
+                raise RuntimeError(
+                    f"{self.project_dir} has uncommitted changes; commit or "
+                    f"stash them first:\n{status}"
+                )
+            return
+        await _git("add", "-A", cwd=self.project_dir)
+        await _git(
+            "commit",
+            "-m",
+            "Initial setup: feature_list.json, init.sh, and project structure",
+            cwd=self.project_dir,
+        )
+
+    async def run(self) -> list[SessionResult]:
+        await self.initialize()
+        pending = [
+            i
+            for i, feature in enumerate(get_ledger(self.project_dir).features)
+            if not feature.get("passes")
+        ]
+        print(f"{len(pending)} features to implement, {self.concurrency} at a time")
+        self._invalid = _dependency_errors(
+            get_ledger(self.project_dir).features, pending
+        )
+        self._finished = {i: asyncio.Event() for i in pending}
+        self._passed: dict[int, bool] = {}
+        results = await asyncio.gather(*(self.run_feature(i) for i in pending))
+        shutil.rmtree(self.worktrees_dir, ignore_errors=True)
+        await _git("worktree", "prune", cwd=self.project_dir)
+        return list(results)
+
+    async def run_feature(self, feature: int) -> SessionResult:
+        try:
+            result = await self._run_feature(feature)
+        finally:
+            self._passed.setdefault(feature, False)
+            self._finished[feature].set()
+        self._passed[feature] = result.passed
+        return result
+
+    async def _run_feature(self, feature: int) -> SessionResult:
+        if feature in self._invalid:
+            reason = self._invalid[feature]
+            print(f"Feature #{feature}: skipped, {reason}")
+            return SessionResult(feature, 0, False, f"Invalid depends_on: {reason}")
+        depends_on = (
+            get_ledger(self.project_dir).features[feature].get("depends_on", [])
+        )
+        for dependency in depends_on:
+            if dependency not in self._finished:
+                # Already passing, or not a feature
+                continue
+            await self._finished[dependency].wait()
+            if not self._passed[dependency]:
+                print(f"Feature #{feature}: skipped, feature #{dependency} failed")
+                return SessionResult(
+                    feature, 0, False, f"Depends on failed feature #{dependency}"
+                )
+
+        log = ""
+        for attempt in range(1, self.retries + 2):
+            async with self._semaphore:
+                passed, log = await self._attempt(feature, attempt)
+            status = "passed" if passed else "failed"
+            print(f"Feature #{feature}: attempt {attempt} {status}")
+            if passed:
+                return SessionResult(feature, attempt, True, log)
+        return SessionResult(feature, self.retries + 1, False, log)
+
+    async def _attempt(self, feature: int, attempt: int) -> tuple[bool, str]:
+        branch = f"selfheal/feature-{feature}-{attempt}"
+        worktree = self.worktrees_dir / f"feature-{feature}-{attempt}"
+        _, base = await _git("rev-parse", "HEAD", cwd=self.project_dir)
+        base = base.strip()
+
+        code, output = await _git(
+            "worktree", "add", "-b", branch, str(worktree), base, cwd=self.project_dir
+        )
+        if code != 0:
+            return False, output
+
+        try:
+            # Warm worktrees reuse the cached environment in seconds; init.sh
+            # run by the session then skips its own install.
+            try:
+                report = await asyncio.to_thread(bootstrap, worktree, False)
+                env = environment_variables(Path(report["venv"]), worktree)
+                print(
+                    f"Feature #{feature}: dependencies {report['dependencies']}, "
+                    f"project {report['project']}"
+                )
+            except RuntimeError as e:
+                print(f"Feature #{feature}: environment setup failed, continuing: {e}")
+                env = None
+            code, log = await _run(
+                *_session_command("coding", feature), cwd=worktree, env=env
+            )
+            if code != 0:
+                return False, log
+            return await self._merge(feature, branch, worktree, base), log
+        finally:
+            await _git(
+                "worktree", "remove", "--force", str(worktree), cwd=self.project_dir
+            )
+            await _git("branch", "-D", branch, cwd=self.project_dir)
+
+    async def _merge(
+        self, feature: int, branch: str, worktree: Path, base: str
+    ) -> bool:
+        """Merge a finished session and flip its feature to passing."""
+        passed = bool(get_ledger(worktree).features[feature].get("passes"))
+
+        # Take the session's changes to the shared files, then reset them so
+        # the merge itself cannot conflict on them. Sessions may only flip
+        # their own "passes" flag; other feature list edits are dropped.
+        base_progress = await _show(base, PROGRESS_FILE, cwd=self.project_dir)
+        progress_path = worktree / PROGRESS_FILE
+        progress = progress_path.read_text() if progress_path.exists() else ""
+        if progress.startswith(base_progress):
+            progress = progress[len(base_progress) :]
+        base_tests_text = await _show(base, VERIFICATION_FILE, cwd=self.project_dir)
+        base_tests = {int(k): v for k, v in json.loads(base_tests_text or "{}").items()}
+        tests = {
+            index: spec
+            for index, spec in load_mapping(worktree).items()
+            if base_tests.get(index) != spec
+        }
+        for path in (FEATURE_LIST, PROGRESS_FILE, VERIFICATION_FILE):
+            await _restore(base, path, cwd=worktree)
+        await _git("add", "-A", cwd=worktree)
+        await _git("commit", "-m", f"Work on feature #{feature}", cwd=worktree)
+
+        async with self._merge_lock:
+            code, _ = await _git(
+                "merge", "--no-ff", "--no-edit", branch, cwd=self.project_dir
+            )
+            if code != 0:
+                await _git("merge", "--abort", cwd=self.project_dir)
+                return False
+
+            if progress.strip():
+                with open(self.project_dir / PROGRESS_FILE, "a") as f:
+                    f.write(progress if progress.endswith("\n") else progress + "\n")
+            if passed:
+                get_ledger(self.project_dir).set_passes(feature)
+                if tests:
+                    mapping = load_mapping(self.project_dir)
+                    mapping.update(tests)
+                    save_mapping(mapping, self.project_dir)
+            for path in (FEATURE_LIST, PROGRESS_FILE, VERIFICATION_FILE):
+                if (self.project_dir / path).exists():
+                    await _git("add", path, cwd=self.project_dir)
+            message = (
+                f"Mark feature #{feature} as passing"
+                if passed
+                else f"Record progress on feature #{feature}"
+            )
+            await _git("commit", "-m", message, cwd=self.project_dir)
+        return passed
+
+
+async def run_session(kind: str, feature: int | None = None) -> None:
+    """Run one fresh-context agent session in the current directory."""
+    import tools
+    from agent import AGENT_MODEL, _agent
+    from prompts import CODING_PROMPT, INITIALIZER_PROMPT
+    from usage import UsageTracker
+
+    if kind == "initializer":
+        instructions = INITIALIZER_PROMPT
+        prompt = "Begin by reading app_spec.md."
+    else:
+        instructions = CODING_PROMPT
+        description = get_ledger().features[feature]["description"]
+        prompt = (
+            f"Your assigned feature is #{feature} in feature_list.json: {description}\n"
+            "Work only on this feature. Other sessions are working on the others "
+            "in parallel. Begin by running Step 1 (Get Your Bearings)."
+        )
+
+    tracker = UsageTracker()
+    tools.VIEWS.set({})
+    result = await _agent.run(prompt, instructions=instructions)
+    tracker.record(AGENT_MODEL, result.usage())
+    print(result.output)
+    print(f"Usage: {tracker.summary()}")
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="orchestrator",
+        description="Run initializer and coding sessions in parallel worktrees.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Work through feature_list.json.")
+    run_parser.add_argument("project_dir", type=Path)
+    run_parser.add_argument(
+        "--concurrency", type=int, default=4, help="Maximum sessions at once."
+    )
+    run_parser.add_argument(
+        "--retries", type=int, default=2, help="Retries per failed feature."
+    )
+    run_parser.add_argument(
+        "--sandbox",
+        action="store_true",
+        help="Run the sessions' commands with resource limits (see sandbox.py).",
+    )
+
+    session_parser = subparsers.add_parser(
+        "session", help="Run a single session in the current directory."
+    )
+    session_parser.add_argument("kind", choices=["initializer", "coding"])
+    session_parser.add_argument("--feature", type=int, default=None)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = create_parser().parse_args(argv)
+
+    if args.command == "session":
+        if args.kind == "coding" and args.feature is None:
+            print("Error: coding sessions need --feature")
+            return 1
+        asyncio.run(run_session(args.kind, args.feature))
+        return 0
+
+    if args.sandbox:
+        # Inherited by the session subprocesses
+        os.environ["SELFHEAL_SANDBOX"] = "1"
+    orchestrator = Orchestrator(args.project_dir, args.concurrency, args.retries)
+    try:
+        results = asyncio.run(orchestrator.run())
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    passed = sum(r.passed for r in results)
+    print(f"\n{passed}/{len(results)} features passing")
+    for result in results:
+        if not result.passed:
+            print(
+                f"  ✗ Feature #{result.feature} failed after {result.attempts} attempts"
+            )
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MAX_CACHE_BYTES = 16 * 1024 * 1024
+MAX_FILE_BYTES = 512 * 1024
+# Files queued per observed tool result
+MAX_PREFETCH_PER_RESULT = 8
+
+PY_IMPORT = re.compile(
+    r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w, ]+)|import\s+([\w.]+))", re.M
+)
+JS_IMPORT = re.compile(
+    r"""(?:from\s+|require\(\s*|import\s*\(\s*)['"](\.{1,2}/[^'"]+)['"]"""
+)
+# `File "x.py", line 3` (Python tracebacks) and `path/to/x.ts:12` (most others)
+TRACEBACK_PATH = re.compile(r'File "([^"]+)", line \d+')
+LOCATION_PATH = re.compile(r"(?:^|[\s(])((?:[\w.-]+/)*[\w.-]+\.\w+):\d+", re.M)
+JS_EXTENSIONS = ("", ".ts", ".tsx", ".js", ".jsx", "/index.ts", "/index.js")
+
+
+class FileCache:
+    """LRU cache of file contents, bounded in bytes and validated by (mtime, size)."""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[Path, tuple[tuple[int, int], str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path: Path) -> tuple[int, int]:
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: Path) -> str | None:
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != stamp:
+                self._drop(path)
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path: Path, content: str, stamp: tuple[int, int]) -> None:
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(path)
+            self._entries[path] = (stamp, content)
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def load(self, path: Path) -> bool:
+        """Read `path` into the cache unless it is already fresh there."""
+        if self.get(path) is not None:
+            return False
+        try:
+            stamp = self._stamp(path)
+            if stamp[1] > MAX_FILE_BYTES:
+                return False
+            with open(path) as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return False
+        self.put(path, content, stamp)
+        return True
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._entries
+
+    def _drop(self, path: Path) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+def _python_imports(path: Path, content: str, root: Path) -> list[Path]:
+    candidates = []
+    for relative, names, plain in PY_IMPORT.findall(content):
+        module = relative or plain
+        dots = len(module) - len(module.lstrip("."))
+        parts = [p for p in module.lstrip(".").split(".") if p]
+        if dots:
+            base = path.parent
+            for _ in range(dots - 1):
+                base = base.parent
+            bases = [base]
+        else:
+            bases = [root, path.parent]
+        for base in bases:
+            target = base.joinpath(*parts)
+            candidates += [target.with_suffix(".py"), target / "__init__.py"]
+            # `from pkg import module`
+            for name in names.split(","):
+                if name.strip():
+                    candidates.append(target / f"{name.strip()}.py")
+    return candidates
+
+
+def _js_imports(path: Path, content: str) -> list[Path]:
+    return [
+        Path(os.path.normpath(path.parent / (spec + extension)))
+        for spec in JS_IMPORT.findall(content)
+        for extension in JS_EXTENSIONS
+    ]
+
+
+def _test_files(path: Path, root: Path) -> list[Path]:
+    stem, suffix = path.stem, path.suffix
+    if stem.startswith("test_") or ".test" in stem or ".spec" in stem:
+        return []
+    return [
+        path.with_name(f"test_{stem}{suffix}"),
+        root / "tests" / f"test_{stem}{suffix}",
+        path.with_name(f"{stem}.test{suffix}"),
+        path.with_name(f"{stem}.spec{suffix}"),
+    ]
+
+
+def paths_in_output(output: str) -> list[str]:
+    """File paths mentioned in tracebacks, grep matches and compiler errors."""
+    return TRACEBACK_PATH.findall(output) + LOCATION_PATH.findall(output)
+
+
+class Prefetcher:
+    """Loads the files the agent is likely to read next into a FileCache.
+
+    Tools report what they returned (`observe_read`, `observe_output`) and
+    the prefetcher guesses the next reads: a module's imports and tests,
+    files named in grep matches, tracebacks and error locations. Guessing
+    and loading happen on a background thread, so observing never slows
+    down or fails a tool, and `read` can be served from memory. Precision
+    is the share of prefetched files later read.
+    """
+
+    def __init__(self, cache: FileCache | None = None):
+        self.cache = cache or FileCache()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="prefetch"
+        )
+        self._lock = threading.Lock()
+        # Prefetched files not read yet
+        self._unused: set[Path] = set()
+        self.prefetched = 0
+        self.used = 0
+        self.reads = 0
+        self.hits = 0
+
+    def read(self, path: Path) -> str:
+        """Read `path`, from the cache when possible."""
+        path = path.resolve()
+        content = self.cache.get(path)
+        with self._lock:
+            self.reads += 1
+            if path in self._unused:
+                self._unused.discard(path)
+                self.used += 1
+        if content is not None:
+            with self._lock:
+                self.hits += 1
+            return content
+        with open(path) as f:
+            content = f.read()
+        try:
+            stat = path.stat()
+            self.cache.put(path, content, (stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            pass
+        return content
+
+    def observe_read(self, path: Path, content: str, root: Path) -> None:
+        self._submit(self._observe_read, path, content, root)
+
+    def observe_output(self, output: str, root: Path) -> None:
+        self._submit(self._observe_output, output, root)
+
+    def _submit(self, observe, *args) -> None:
+        try:
+            self._executor.submit(self._guarded, observe, *args)
+        except RuntimeError:
+            # Interpreter shutting down
+            pass
+
+    @staticmethod
+    def _guarded(observe, *args) -> None:
+        # Prefetching is best effort; a bad guess must not surface anywhere
+        try:
+            observe(*args)
+        except Exception:
+            pass
+
+    def _observe_read(self, path: Path, content: str, root: Path) -> None:
+        path, root = path.resolve(), root.resolve()
+        if path.suffix == ".py":
+            candidates = _python_imports(path, content, root)
+        elif path.suffix in (".js", ".jsx", ".ts", ".tsx", ".mjs"):
+            candidates = _js_imports(path, content)
+        else:
+            candidates = []
+        self._schedule(candidates + _test_files(path, root), root)
+
+    def _observe_output(self, output: str, root: Path) -> None:
+        root = root.resolve()
+        self._schedule([root / p for p in paths_in_output(output)], root)
+
+    def _schedule(self, candidates: list[Path], root: Path) -> None:
+        seen, chosen = set(), []
+        for candidate in candidates:
+            candidate = Path(os.path.normpath(candidate))
+            if candidate in seen or candidate in self.cache:
+                continue
+            seen.add(candidate)
+            # Stay inside the workspace and skip what doesn't exist
+            if root not in candidate.parents or not candidate.is_file():
+                continue
+            chosen.append(candidate)
+            if len(chosen) == MAX_PREFETCH_PER_RESULT:
+                break
+        self._load(chosen)
+
+    def _load(self, paths: list[Path]) -> None:
+        for path in paths:
+            if self.cache.load(path):
+                with self._lock:
+                    self.prefetched += 1
+                    self._unused.add(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reads": self.reads,
+                "cache_hits": self.hits,
+                "prefetched": self.prefetched,
+                "prefetched_used": self.used,
+                "precision": round(self.used / self.prefetched, 3)
+                if self.prefetched
+                else None,
+                "cache_bytes": self.cache.size,
+            }
+
+
+PREFETCHER = Prefetcher()
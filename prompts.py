@@ -209,6 +209,8 @@ needs to be built.
 - Mix of narrow tests (2-5 steps) and comprehensive tests (10+ steps)
 - At least 25 tests MUST have 10+ steps each
 - Order features by priority: fundamental features first
+- Features are implemented in parallel; if a feature cannot work until others
+  pass, add `"depends_on": [<indexes of those features>]` to it
 - ALL tests start with "passes": false
 - Cover every feature in the spec exhaustively
 
@@ -289,19 +291,20 @@ ls -la
 # 3. Read the project specification to understand what you're building
 cat app_spec.md
 
-# 4. Read the feature list to see all work
-cat feature_list.json | head -50
-
-# 5. Read progress notes from previous sessions
+# 4. Read progress notes from previous sessions
 cat claude-progress.txt
 
-# 6. Check recent git history
+# 5. Check recent git history
 git log --oneline -20
-
-# 7. Count remaining tests
-cat feature_list.json | grep '"passes": false' | wc -l
 ```
 
+Call `repo_map` once to see the project's files, classes, functions and signatures,
+instead of listing and reading files one by one.
+
+Then use the feature ledger tools instead of reading `feature_list.json` directly:
+- `feature_status` - passing/failing counts, overall and by category
+- `next_feature` - the highest-priority feature with "passes": false
+
 Understanding the `app_spec.md` is critical - it contains the full requirements
 for the application you're building.
 
@@ -322,11 +325,14 @@ Otherwise, start servers manually and document the process.
 The previous session may have introduced bugs. Before implementing anything
 new, you MUST run verification tests.
 
-Run 1-2 of the feature tests marked as `"passes": true` that are most core to the app's functionality to verify they still work.
+Call `verify_features` first. It re-runs, in parallel, the registered test command of every
+passing feature affected by changes since its last green run, and returns a short pass/fail summary.
+
+Then run 1-2 of the feature tests marked as `"passes": true` that are most core to the app's functionality to verify they still work.
 For example, if this were a chat app, you should perform a test that logs into the app, sends a message, and gets a response.
 
 **If you find ANY issues (functional or visual):**
-- Mark that feature as "passes": false immediately
+- Mark that feature as "passes": false immediately with `mark_feature(index, passes=False)`
 - Add issues to a list
 - Fix all issues BEFORE moving to new features
 - This includes UI bugs like:
@@ -340,7 +346,7 @@ For example, if this were a chat app, you should perform a test that logs into t
 
 ### STEP 4: CHOOSE ONE FEATURE TO IMPLEMENT
 
-Look at feature_list.json and find the highest-priority feature with "passes": false.
+Call `next_feature` to get the highest-priority feature with "passes": false.
 
 Focus on completing one feature perfectly and completing its testing steps in this session before moving on to other features.
 It's ok if you only complete one feature in this session, as there will be more sessions later that continue to make progress.
@@ -379,7 +385,7 @@ Use browser automation tools:
 
 **YOU CAN ONLY MODIFY ONE FIELD: "passes"**
 
-After thorough verification, change:
+After thorough verification, call `mark_feature(index)` to change:
 ```json
 "passes": false
 ```
@@ -388,6 +394,8 @@ to:
 "passes": true
 ```
 
+The tool refuses any other change and writes the file atomically.
+
 **NEVER:**
 - Remove tests
 - Edit test descriptions
@@ -397,6 +405,10 @@ to:
 
 **ONLY CHANGE "passes" FIELD AFTER VERIFICATION WITH SCREENSHOTS.**
 
+When you mark a feature passing, also call `set_feature_test(index, command, paths)` with an
+automated test command for it (e.g. `pytest tests/test_chat.py`) and the source paths it
+depends on, so later sessions can re-verify it automatically.
+
 ### STEP 8: COMMIT YOUR PROGRESS
 
 Make a descriptive git commit:
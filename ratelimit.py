@@ -0,0 +1,406 @@
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import TypeVar
+
+from pydantic_ai.exceptions import ModelAPIError, ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import (
+    Model,
+    ModelRequestParameters,
+    StreamedResponse,
+    infer_model,
+)
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.providers import Provider, infer_provider
+from pydantic_ai.settings import ModelSettings
+
+T = TypeVar("T")
+
+# (requests/min, tokens/min) per model; unknown models get the default
+RATE_LIMITS = {
+    "gpt-5-mini": (500, 500_000),
+    "gemini-3-flash-preview": (1_000, 1_000_000),
+}
+DEFAULT_RATE_LIMIT = (60, 100_000)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Rough size of a token, used to estimate a request before it is sent
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """Refills at `per_minute` units a minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(amount - self.level, 0) / self.rate
+
+    def take(self, amount: float) -> None:
+        # May go negative, e.g. when correcting an estimate after the fact
+        self._refill()
+        self.level -= amount
+
+
+@dataclass
+class SchedulerMetrics:
+    queued: int = 0
+    in_flight: int = 0
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    slow: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.requests if self.requests else 0.0
+
+
+@dataclass
+class ProviderScheduler:
+    """Admission control and retries for one model.
+
+    Requests wait for the requests/min and tokens/min buckets and for a
+    concurrency slot. The concurrency limit follows AIMD: it grows by
+    1/limit after each fast success, shrinks by `slow_decrease` after a
+    success slower than `latency_target` and halves on a 429/5xx. Failed
+    requests are retried with full-jitter exponential backoff, or after
+    the provider's Retry-After when it sends one.
+    """
+
+    requests_per_minute: float
+    tokens_per_minute: float
+    max_concurrency: float = 32
+    min_concurrency: float = 1
+    latency_target: float = 30.0
+    # Gentler than on errors: a slow response is a hint, not a rejection
+    slow_decrease: float = 0.9
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    limit: float = 4
+    metrics: SchedulerMetrics = field(default_factory=SchedulerMetrics)
+
+    def __post_init__(self):
+        self._requests = TokenBucket(self.requests_per_minute)
+        self._tokens = TokenBucket(self.tokens_per_minute)
+        self._changed = asyncio.Condition()
+
+    async def _admit(self, tokens: int) -> None:
+        async with self._changed:
+            while True:
+                if self.metrics.in_flight < int(self.limit):
+                    delay = max(self._requests.delay(1), self._tokens.delay(tokens))
+                    if delay == 0:
+                        break
+                else:
+                    delay = None
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except TimeoutError:
+                    pass
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self.metrics.in_flight += 1
+
+    async def release(self) -> None:
+        """Give back a concurrency slot held by `run(..., hold=True)`."""
+        # Freed before any await so that a cancelled caller cannot leak it
+        self.metrics.in_flight -= 1
+        await asyncio.shield(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        if latency <= self.latency_target:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.min_concurrency, self.limit * self.slow_decrease)
+            self.metrics.slow += 1
+
+    def _on_failure(self) -> None:
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        self.metrics.throttled += 1
+
+    def correct(self, estimated: int, actual: int) -> None:
+        """Charge the token bucket for the difference once usage is known."""
+        self._tokens.take(actual - estimated)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def run(
+        self, call: Callable[[], Awaitable[T]], tokens: int = 0, hold: bool = False
+    ) -> T:
+        """Run `call` once admitted, retrying retryable provider errors.
+
+        With `hold`, the concurrency slot stays taken after a successful call
+        until the caller calls `release`. Otherwise, and whenever the call
+        fails or is cancelled, it is released here.
+        """
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            self.metrics.queued += 1
+            try:
+                await self._admit(tokens)
+            finally:
+                self.metrics.queued -= 1
+            wait = time.monotonic() - queued_at
+            self.metrics.requests += 1
+            self.metrics.total_wait += wait
+            self.metrics.max_wait = max(self.metrics.max_wait, wait)
+
+            started, succeeded = time.monotonic(), False
+            try:
+                result = await call()
+                succeeded = True
+            except ModelAPIError as e:
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self._on_failure()
+                self.metrics.retries += 1
+                error = e
+            finally:
+                if not (succeeded and hold):
+                    await self.release()
+            if succeeded:
+                self._on_success(time.monotonic() - started)
+                return result
+            await asyncio.sleep(self.backoff(attempt, error))
+        raise AssertionError("unreachable")
+
+
+def _is_retryable(error: ModelAPIError) -> bool:
+    if isinstance(error, ModelHTTPError):
+        return error.status_code in RETRYABLE_STATUS
+    # Connection errors and timeouts
+    return True
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds from the Retry-After header of the underlying HTTP response."""
+    response = getattr(error.__cause__, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+_schedulers: dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(model_name: str) -> ProviderScheduler:
+    """Return the process-wide scheduler for `model_name`."""
+    scheduler = _schedulers.get(model_name)
+    if scheduler is None:
+        rpm, tpm = RATE_LIMITS.get(model_name, DEFAULT_RATE_LIMIT)
+        scheduler = _schedulers[model_name] = ProviderScheduler(rpm, tpm)
+    return scheduler
+
+
+def scheduler_metrics() -> dict[str, dict]:
+    return {
+        name: {
+            "queue_depth": s.metrics.queued,
+            "in_flight": s.metrics.in_flight,
+            "concurrency_limit": round(s.limit, 2),
+            "requests": s.metrics.requests,
+            "retries": s.metrics.retries,
+            "throttled": s.metrics.throttled,
+            "slow": s.metrics.slow,
+            "avg_wait": round(s.metrics.avg_wait, 3),
+            "max_wait": round(s.metrics.max_wait, 3),
+        }
+        for name, s in _schedulers.items()
+    }
+
+
+def _estimate_tokens(messages: list[ModelMessage]) -> int:
+    chars = 0
+    for message in messages:
+        for part in message.parts:
+            content = getattr(part, "content", None) or getattr(part, "args", None)
+            chars += len(str(content)) if content else 0
+    return chars // CHARS_PER_TOKEN
+
+
+class RateLimitedModel(WrapperModel):
+    """Routes every request of the wrapped model through its ProviderScheduler."""
+
+    @property
+    def scheduler(self) -> ProviderScheduler:
+        return get_scheduler(self.model_name)
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        estimate = _estimate_tokens(messages)
+        response = await self.scheduler.run(
+            lambda: self.wrapped.request(
+                messages, model_settings, model_request_parameters
+            ),
+            estimate,
+        )
+        self.scheduler.correct(estimate, response.usage.total_tokens)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context=None,
+    ) -> AsyncIterator[StreamedResponse]:
+        # Opening the stream is scheduled and retried; once tokens flow,
+        # errors propagate to the caller. The slot is held until it closes.
+        scheduler = self.scheduler
+        estimate = _estimate_tokens(messages)
+        context = None
+
+        async def open_stream():
+            nonlocal context
+            context = self.wrapped.request_stream(
+                messages, model_settings, model_request_parameters, run_context
+            )
+            return await context.__aenter__()
+
+        stream = await scheduler.run(open_stream, estimate, hold=True)
+        try:
+            try:
+                yield stream
+            except BaseException as e:
+                if not await context.__aexit__(type(e), e, e.__traceback__):
+                    raise
+            else:
+                await context.__aexit__(None, None, None)
+        finally:
+            await scheduler.release()
+            scheduler.correct(estimate, stream.usage().total_tokens)
+
+
+def _provider(name: str) -> Provider:
+    """`infer_provider(name)`, with the SDK client's own retries turned off.
+
+    Otherwise e.g. the OpenAI SDK absorbs 429s with its own backoff before
+    the scheduler sees them, so AIMD reacts late and attempts multiply.
+    """
+    provider = infer_provider(name)
+    client = provider.client
+    if isinstance(getattr(client, "max_retries", None), int):
+        client.max_retries = 0
+    return provider
+
+
+def rate_limited(model: Model | str) -> RateLimitedModel:
+    if isinstance(model, str):
+        model = infer_model(model, provider_factory=_provider)
+    return RateLimitedModel(model)
+
+
+if __name__ == "__main__":
+    # Self-check against a local model that is throttled twice:
+    # `python ratelimit.py`
+    import os
+
+    import httpx
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import TextPart
+    from pydantic_ai.models.function import FunctionModel
+
+    def throttled(after: str) -> ModelHTTPError:
+        request = httpx.Request("POST", "https://provider.invalid/v1/chat")
+        response = httpx.Response(429, headers={"retry-after": after}, request=request)
+        error = ModelHTTPError(429, "local")
+        error.__cause__ = httpx.HTTPStatusError(
+            "429", request=request, response=response
+        )
+        return error
+
+    async def main():
+        failures = 2
+
+        async def respond(messages, info):
+            nonlocal failures
+            if failures:
+                failures -= 1
+                raise throttled("0.2")
+            return ModelResponse(parts=[TextPart("ok")])
+
+        model = rate_limited(FunctionModel(respond))
+        scheduler = model.scheduler
+        started = time.monotonic()
+        result = await Agent(model).run("hi")
+        elapsed = time.monotonic() - started
+        assert result.output == "ok", result.output
+        assert scheduler.metrics.retries == 2, scheduler.metrics
+        assert scheduler.metrics.throttled == 2, scheduler.metrics
+        assert scheduler.metrics.requests == 3, scheduler.metrics
+        assert scheduler.limit == 4 / 2 / 2 + 1, scheduler.limit
+        assert scheduler.metrics.in_flight == 0, scheduler.metrics
+        assert elapsed >= 0.4, f"Retry-After not honoured ({elapsed:.2f}s)"
+
+        # Slots come back when a call is cancelled or fails unexpectedly
+        call = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        assert scheduler.metrics.in_flight == 0, scheduler.metrics
+
+        async def broken():
+            raise ValueError("not a provider error")
+
+        try:
+            await scheduler.run(broken, hold=True)
+        except ValueError:
+            pass
+        assert scheduler.metrics.in_flight == 0, scheduler.metrics
+
+        # Slow successes shrink the limit, gently
+        scheduler.latency_target, limit = 0.01, scheduler.limit
+        await scheduler.run(lambda: asyncio.sleep(0.05))
+        assert scheduler.limit == limit * scheduler.slow_decrease, scheduler.limit
+        assert scheduler.metrics.slow == 1, scheduler.metrics
+
+        # Only the scheduler retries
+        os.environ.setdefault("OPENAI_API_KEY", "unused")
+        assert rate_limited("openai:gpt-5-mini").wrapped.client.max_retries == 0
+        print(f"OK: {scheduler_metrics()}")
+
+    asyncio.run(main())
@@ -0,0 +1,414 @@
+import ast
+import atexit
+import builtins
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from memo import MEMO
+from state import STATE_DIR, make_state_dir
+
+INDEX_PATH = Path(STATE_DIR) / "repomap.json"
+# Bumped whenever the layout of a file entry changes
+INDEX_VERSION = 2
+IGNORED_DIRS = {".git", ".venv", "venv", "node_modules", "__pycache__", ".selfheal"}
+MAX_FILE_SIZE = 1_000_000
+# Seconds between rewrites of the index file
+SAVE_INTERVAL = 30.0
+# Rough size of a token, used to keep the map within a budget
+CHARS_PER_TOKEN = 4
+
+# Names too ambiguous to rank symbols by: builtins and methods of built-in
+# types and files (a method `get` is mostly matched by dict.get calls).
+GENERIC_NAMES = set(dir(builtins)).union(
+    *(
+        dir(t)
+        for t in (dict, list, str, set, bytes, tuple, int, object, io.TextIOWrapper)
+    )
+)
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# Lightweight definition patterns for non-Python sources: (kind, regex with
+# a "name" group). The matched line is used as the signature.
+_JS = [
+    (
+        "function",
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\*?\s+(?P<name>\w+)",
+    ),
+    (
+        "class",
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(?P<name>\w+)",
+    ),
+    (
+        "function",
+        r"^\s*(?:export\s+)?(?:const|let|var)\s+(?P<name>\w+)\s*=\s*(?:async\s*)?(?:\([^)]*\)|\w+)\s*=>",
+    ),
+    ("type", r"^\s*(?:export\s+)?(?:interface|type|enum)\s+(?P<name>\w+)"),
+]
+PATTERNS = {
+    ".js": _JS,
+    ".jsx": _JS,
+    ".ts": _JS,
+    ".tsx": _JS,
+    ".mjs": _JS,
+    ".go": [
+        ("function", r"^func\s+(?:\([^)]*\)\s*)?(?P<name>\w+)"),
+        ("type", r"^type\s+(?P<name>\w+)\s+(?:struct|interface)"),
+    ],
+    ".rs": [
+        ("function", r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+(?P<name>\w+)"),
+        ("type", r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait)\s+(?P<name>\w+)"),
+    ],
+    ".java": [
+        (
+            "class",
+            r"^\s*(?:public\s+|private\s+|protected\s+)?(?:abstract\s+|final\s+|static\s+)*(?:class|interface|enum|record)\s+(?P<name>\w+)",
+        ),
+        (
+            "function",
+            r"^\s+(?:public|private|protected)\s+[\w<>\[\], ]+\s+(?P<name>\w+)\s*\(",
+        ),
+    ],
+    ".rb": [
+        ("class", r"^\s*(?:class|module)\s+(?P<name>[\w:]+)"),
+        ("function", r"^\s*def\s+(?:self\.)?(?P<name>\w+[?!=]?)"),
+    ],
+    ".c": [("function", r"^[\w\*][\w\s\*]*?\b(?P<name>\w+)\s*\([^;]*$")],
+    ".h": [("function", r"^[\w\*][\w\s\*]*?\b(?P<name>\w+)\s*\([^;]*;?$")],
+}
+PATTERNS = {
+    ext: [(kind, re.compile(pattern)) for kind, pattern in patterns]
+    for ext, patterns in PATTERNS.items()
+}
+SOURCE_EXTENSIONS = {".py", *PATTERNS}
+
+
+def _python_symbols(source: str) -> list[list]:
+    """[kind, name, signature, line] for classes, functions and methods."""
+    symbols = []
+
+    def signature(node, owner: str = "") -> str:
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        return f"{prefix} {owner}{node.name}({ast.unparse(node.args)}){returns}"
+
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(["function", node.name, signature(node), node.lineno])
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            sig = f"class {node.name}({bases})" if bases else f"class {node.name}"
+            symbols.append(["class", node.name, sig, node.lineno])
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(
+                        [
+                            "method",
+                            f"{node.name}.{item.name}",
+                            signature(item, f"{node.name}."),
+                            item.lineno,
+                        ]
+                    )
+    return symbols
+
+
+def _pattern_symbols(source: str, suffix: str) -> list[list]:
+    symbols = []
+    for lineno, line in enumerate(source.splitlines(), 1):
+        for kind, pattern in PATTERNS[suffix]:
+            match = pattern.match(line)
+            if match:
+                signature = line.strip().rstrip("{").strip()[:120]
+                symbols.append([kind, match["name"], signature, lineno])
+                break
+    return symbols
+
+
+def _occurrences(source: str) -> dict[str, list[int]]:
+    """Line numbers on which each identifier appears."""
+    lines: dict[str, list[int]] = {}
+    for lineno, line in enumerate(source.splitlines(), 1):
+        for name in set(IDENTIFIER.findall(line)):
+            lines.setdefault(name, []).append(lineno)
+    return lines
+
+
+def parse_file(source: str, suffix: str) -> dict:
+    """Index one source file: its symbols and identifier occurrences."""
+    if suffix == ".py":
+        try:
+            symbols = _python_symbols(source)
+        except SyntaxError:
+            symbols = []
+    else:
+        symbols = _pattern_symbols(source, suffix)
+    return {"symbols": symbols, "lines": _occurrences(source)}
+
+
+def iter_source_files(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            d for d in dirnames if d not in IGNORED_DIRS and not d.startswith(".")
+        ]
+        for filename in filenames:
+            path = Path(dirpath) / filename
+            if path.suffix in SOURCE_EXTENSIONS:
+                yield path
+
+
+class RepoMap:
+    """Persistent symbol and cross-reference index of a workspace.
+
+    Entries are keyed by path relative to the root. Refreshing stats every
+    file and only hashes those whose (mtime, size) moved; a file is re-parsed
+    only when its content hash changed, and only its own entries in the
+    in-memory definition and reference indexes are replaced. The index file
+    is rewritten at most every SAVE_INTERVAL seconds (and at exit).
+    """
+
+    def __init__(self, root: Path = Path(".")):
+        self.root = root
+        self.index_path = root / INDEX_PATH
+        self.files: dict[str, dict] = {}
+        # name -> {path: symbols} and name -> {path: line numbers}
+        self._definitions: dict[str, dict[str, list[list]]] = {}
+        self._references: dict[str, dict[str, list[int]]] = {}
+        # Source lines of recently shown files, for snippets
+        self._sources: dict[str, tuple[list, list[str]]] = {}
+        # Workspace generation (see memo.py) the index was refreshed at
+        self._generation: int | None = None
+        self._dirty = False
+        self._saved_at = 0.0
+        # Shared by every session working in this root (see server.py)
+        self._lock = threading.RLock()
+        if self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text())
+                if data.get("version") == INDEX_VERSION:
+                    self.files = data["files"]
+            except ValueError:
+                pass
+        for rel, entry in self.files.items():
+            self._index(rel, entry)
+
+    def _index(self, rel: str, entry: dict) -> None:
+        for symbol in entry["symbols"]:
+            name = symbol[1]
+            self._definitions.setdefault(name, {}).setdefault(rel, []).append(symbol)
+            if "." in name:
+                short = name.rsplit(".", 1)[-1]
+                self._definitions.setdefault(short, {}).setdefault(rel, []).append(
+                    symbol
+                )
+        for name, lines in entry["lines"].items():
+            self._references.setdefault(name, {})[rel] = lines
+
+    def _unindex(self, rel: str, entry: dict) -> None:
+        for symbol in entry["symbols"]:
+            names = [symbol[1]]
+            if "." in symbol[1]:
+                names.append(symbol[1].rsplit(".", 1)[-1])
+            for name in names:
+                by_file = self._definitions.get(name)
+                if by_file is not None and by_file.pop(rel, None) and not by_file:
+                    del self._definitions[name]
+        for name in entry["lines"]:
+            by_file = self._references.get(name)
+            if by_file is not None:
+                by_file.pop(rel, None)
+                if not by_file:
+                    del self._references[name]
+
+    def _replace(self, rel: str, entry: dict | None) -> None:
+        old = self.files.pop(rel, None)
+        if old is not None:
+            self._unindex(rel, old)
+        if entry is not None:
+            self.files[rel] = entry
+            self._index(rel, entry)
+
+    def refresh(self) -> int:
+        """Bring the index up to date; returns the number of files re-parsed.
+
+        Nothing is re-stat'ed while the workspace generation is unchanged,
+        i.e. no tool changed files and polling saw no outside change.
+        """
+        with self._lock:
+            generation = MEMO.generation(self.root)
+            if generation == self._generation:
+                return 0
+            self._generation = generation
+
+            seen, parsed = set(), 0
+            for path in iter_source_files(self.root):
+                rel = path.relative_to(self.root).as_posix()
+                seen.add(rel)
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                stamp = [stat.st_mtime_ns, stat.st_size]
+                entry = self.files.get(rel)
+                if entry is not None and entry["stamp"] == stamp:
+                    continue
+                self._dirty = True
+                if stat.st_size > MAX_FILE_SIZE:
+                    self._replace(
+                        rel, {"stamp": stamp, "hash": "", "symbols": [], "lines": {}}
+                    )
+                    continue
+                content = path.read_bytes()
+                digest = hashlib.sha1(content).hexdigest()
+                if entry is not None and entry["hash"] == digest:
+                    entry["stamp"] = stamp
+                    continue
+                source = content.decode(errors="replace")
+                self._replace(
+                    rel,
+                    {"stamp": stamp, "hash": digest, **parse_file(source, path.suffix)},
+                )
+                parsed += 1
+
+            for rel in self.files.keys() - seen:
+                self._replace(rel, None)
+                self._dirty = True
+            if self._dirty and time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                self.save()
+            return parsed
+
+    def save(self) -> None:
+        with self._lock:
+            make_state_dir(self.index_path.parent)
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "files": self.files}))
+            os.replace(tmp, self.index_path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def definitions(self, name: str) -> list[tuple[str, list]]:
+        """(path, [kind, name, signature, line]) for every definition of `name`.
+
+        `name` may be a plain name or Class.method.
+        """
+        with self._lock:
+            return [
+                (rel, symbol)
+                for rel, symbols in self._definitions.get(name, {}).items()
+                for symbol in symbols
+            ]
+
+    def references(self, name: str) -> list[tuple[str, int]]:
+        """(path, line) of every line using `name`, excluding its definitions."""
+        with self._lock:
+            short = name.rsplit(".", 1)[-1]
+            defined_at = {(rel, symbol[3]) for rel, symbol in self.definitions(name)}
+            return [
+                (rel, line)
+                for rel, lines in self._references.get(short, {}).items()
+                for line in lines
+                if (rel, line) not in defined_at
+            ]
+
+    def _source_lines(self, rel: str) -> list[str]:
+        stamp = self.files[rel]["stamp"]
+        cached = self._sources.get(rel)
+        if cached is None or cached[0] != stamp:
+            try:
+                with open(self.root / rel, errors="replace") as f:
+                    cached = self._sources[rel] = (stamp, f.read().splitlines())
+            except OSError:
+                return []
+        return cached[1]
+
+    def snippet(self, rel: str, line: int, after: int = 0) -> str:
+        """Line `line` of `rel` (1-based) and the `after` lines following it."""
+        with self._lock:
+            lines = self._source_lines(rel)
+            return "\n".join(
+                f"{n}: {text}"
+                for n, text in enumerate(lines[line - 1 : line + after], line)
+            )
+
+    def score(self, name: str, rel: str) -> int:
+        """How often `name`, defined in `rel`, is used in other files.
+
+        Dunders and generic names are not counted, and a method's uses are
+        only counted in files that mention its class.
+        """
+        owner, _, short = name.rpartition(".")
+        if short in GENERIC_NAMES or (short.startswith("__") and short.endswith("__")):
+            return 0
+        uses = self._references.get(short, {})
+        if owner:
+            files = self._references.get(owner.rsplit(".", 1)[-1], {}).keys()
+        else:
+            files = uses.keys()
+        return sum(len(uses.get(other, ())) for other in files if other != rel)
+
+    def render(self, max_tokens: int = 2000) -> str:
+        """Files and their symbols, most referenced first, within `max_tokens`."""
+        with self._lock:
+            ranked = []
+            for rel, entry in self.files.items():
+                if not entry["symbols"]:
+                    continue
+                scored = [
+                    (self.score(name, rel), line, signature)
+                    for kind, name, signature, line in entry["symbols"]
+                ]
+                ranked.append((sum(s for s, _, _ in scored), rel, scored))
+            ranked.sort(key=lambda item: (-item[0], item[1]))
+
+            budget = max_tokens * CHARS_PER_TOKEN
+            lines, shown = [], 0
+            for file_score, rel, scored in ranked:
+                file_lines = [f"{rel}:"]
+                cost = len(file_lines[0]) + 1
+                for score, line, signature in sorted(
+                    scored, key=lambda s: (-s[0], s[1])
+                ):
+                    text = f"  {line}: {signature}" + (
+                        f"  [refs {score}]" if score else ""
+                    )
+                    if cost + len(text) + 1 > budget:
+                        break
+                    file_lines.append(text)
+                    cost += len(text) + 1
+                if len(file_lines) == 1:
+                    break
+                lines.extend(file_lines)
+                budget -= cost
+                shown += 1
+            if shown < len(ranked):
+                lines.append(
+                    f"... {len(ranked) - shown} more files omitted (token budget)"
+                )
+            return "\n".join(lines)
+
+
+_maps: dict[Path, RepoMap] = {}
+_maps_lock = threading.Lock()
+
+
+@atexit.register
+def _save_maps() -> None:
+    for repo_map in _maps.values():
+        if repo_map._dirty:
+            repo_map.save()
+
+
+def get_repo_map(root: Path = Path(".")) -> RepoMap:
+    """Return the cached, refreshed map for `root`."""
+    root = root.resolve()
+    with _maps_lock:
+        repo_map = _maps.get(root)
+        if repo_map is None:
+            repo_map = _maps[root] = RepoMap(root)
+    repo_map.refresh()
+    return repo_map
@@ -0,0 +1,329 @@
+import atexit
+import functools
+import itertools
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class Limits:
+    """Per-command resource limits for sandboxed execution.
+
+    `processes` caps the command's own processes through a pids cgroup when
+    one can be created. Otherwise it falls back to RLIMIT_NPROC, set to the
+    user's current process count plus `processes`; the kernel does not
+    enforce that for root.
+    """
+
+    cpu_seconds: int = 120
+    memory_bytes: int = 2 * 1024**3
+    open_files: int = 512
+    processes: int = 256
+    wall_seconds: int = 600
+    # Run in fresh user (and, unless background processes may outlive the
+    # command, PID) namespaces when `unshare` allows it
+    isolate: bool = True
+    # Let processes started in the background (e.g. `npm run dev &`) keep
+    # running after the command exits, with the limits above but no wall
+    # time, until this process exits. Otherwise the whole process group is
+    # killed when the command exits.
+    allow_background: bool = False
+
+
+def limits_from_env() -> Limits | None:
+    """Limits configured through SELFHEAL_SANDBOX* variables, if enabled.
+
+    Lets processes started by the orchestrator or server opt in without a
+    CLI of their own.
+    """
+    if os.environ.get("SELFHEAL_SANDBOX", "") in ("", "0"):
+        return None
+    limits = Limits()
+    if "SELFHEAL_SANDBOX_CPU" in os.environ:
+        limits.cpu_seconds = int(os.environ["SELFHEAL_SANDBOX_CPU"])
+    if "SELFHEAL_SANDBOX_MEMORY_MB" in os.environ:
+        limits.memory_bytes = int(os.environ["SELFHEAL_SANDBOX_MEMORY_MB"]) * 1024**2
+    if os.environ.get("SELFHEAL_SANDBOX_KEEP_BACKGROUND", "") not in ("", "0"):
+        limits.allow_background = True
+    return limits
+
+
+@functools.cache
+def namespaces_available() -> bool:
+    """Whether unprivileged user and PID namespaces work on this host."""
+    if shutil.which("unshare") is None:
+        return False
+    try:
+        result = subprocess.run(
+            _unshare_prefix() + ["true"], capture_output=True, timeout=5
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def _unshare_prefix(pid_namespace: bool = True) -> list[str]:
+    prefix = ["unshare", "--user", "--map-root-user"]
+    if pid_namespace:
+        # Everything in the namespace dies with the command
+        prefix += ["--pid", "--fork", "--mount-proc"]
+    return prefix
+
+
+@functools.cache
+def _pids_cgroup_root() -> Path | None:
+    """This process's pids cgroup directory, if sub-cgroups can be made in it."""
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        if "pids" in controllers.split(","):
+            root = Path("/sys/fs/cgroup/pids") / path.lstrip("/")
+        elif controllers == "":
+            # cgroup v2; pids.max exists in children once the controller is on
+            root = Path("/sys/fs/cgroup") / path.lstrip("/")
+        else:
+            continue
+        probe = root / f"selfheal-probe-{os.getpid()}"
+        try:
+            probe.mkdir()
+        except OSError:
+            continue
+        usable = (probe / "pids.max").exists()
+        probe.rmdir()
+        if usable:
+            return root
+    return None
+
+
+_cgroup_ids = itertools.count()
+
+
+def _make_pids_cgroup(processes: int) -> Path | None:
+    root = _pids_cgroup_root()
+    if root is None:
+        return None
+    cgroup = root / f"selfheal-{os.getpid()}-{next(_cgroup_ids)}"
+    try:
+        cgroup.mkdir()
+        (cgroup / "pids.max").write_text(str(processes))
+    except OSError:
+        _remove_cgroup(cgroup)
+        return None
+    return cgroup
+
+
+def _remove_cgroup(cgroup: Path) -> None:
+    # Killed processes may take a moment to be reaped and leave it
+    for _ in range(50):
+        try:
+            cgroup.rmdir()
+            return
+        except FileNotFoundError:
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _user_processes() -> int:
+    uid = os.getuid()
+    count = 0
+    for entry in os.scandir("/proc"):
+        try:
+            if entry.name.isdigit() and entry.stat().st_uid == uid:
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def _limit_script(limits: Limits, cgroup: Path | None) -> str:
+    """Shell that joins `cgroup`, applies `limits` and then execs its arguments.
+
+    Limits are applied here rather than in a preexec_fn, which is unsafe in
+    processes that run threads.
+    """
+    processes = limits.processes
+    if cgroup is None:
+        processes += _user_processes()
+    steps = [f'echo $$ > "{cgroup}/cgroup.procs"'] if cgroup is not None else []
+    for flag, which, value in (
+        ("-t", resource.RLIMIT_CPU, limits.cpu_seconds),
+        ("-v", resource.RLIMIT_AS, limits.memory_bytes // 1024),
+        ("-n", resource.RLIMIT_NOFILE, limits.open_files),
+        ("-u", resource.RLIMIT_NPROC, processes),
+        ("-c", resource.RLIMIT_CORE, 0),
+    ):
+        _, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            # RLIMIT_AS is in bytes, `ulimit -v` in KiB
+            value = min(value, hard // 1024 if flag == "-v" else hard)
+        steps.append(f"ulimit -S -H {flag} {value}")
+    return " && ".join(steps + ['exec "$@"'])
+
+
+def _kill(pgid: int, cgroup: Path | None) -> None:
+    """Kill process group `pgid` and anything else left in `cgroup`."""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    if cgroup is None:
+        return
+    try:
+        pids = (cgroup / "cgroup.procs").read_text().split()
+    except OSError:
+        return
+    for pid in pids:
+        try:
+            os.kill(int(pid), signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+# Process groups (and their cgroups) left running by commands, killed at exit
+_background: dict[int, Path | None] = {}
+
+
+@atexit.register
+def kill_background() -> None:
+    """Kill what sandboxed commands left running in the background."""
+    for pgid, cgroup in list(_background.items()):
+        _kill(pgid, cgroup)
+        _background.pop(pgid, None)
+        if cgroup is not None:
+            _remove_cgroup(cgroup)
+
+
+def _drain(stream, sink: list[str], log: bool, done: threading.Event) -> None:
+    for line in iter(stream.readline, ""):
+        # Output of background processes after the command returned is dropped
+        if done.is_set():
+            continue
+        if log:
+            print(f"[Stream]: {line.strip()}")
+        sink.append(line)
+
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def run_sandboxed(command: str, cwd: str, limits: Limits, log: bool = False) -> str:
+    """Run `command` under `limits` and report its resource usage.
+
+    The command gets its own session (so a timeout kills the whole process
+    group), a pids cgroup when available, a scratch TMPDIR and, when
+    available, fresh namespaces. The group is killed when the command exits
+    unless `limits.allow_background`; then background processes keep
+    running (and keep the scratch directory) until this process exits, and
+    the output so far is returned without waiting for them.
+    """
+    isolated = limits.isolate and namespaces_available()
+    cgroup = _make_pids_cgroup(limits.processes)
+    args = ["/bin/bash", "-c", _limit_script(limits, cgroup), "selfheal-sandbox"]
+    if isolated:
+        args += _unshare_prefix(pid_namespace=not limits.allow_background)
+    args += ["nice", "-n", "5", "/bin/bash", "-c", command]
+
+    scratch = tempfile.mkdtemp(prefix="selfheal-scratch-")
+    env = {**os.environ, "TMPDIR": scratch, "TMP": scratch, "TEMP": scratch}
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+    except Exception as e:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if cgroup is not None:
+            _remove_cgroup(cgroup)
+        return f"EXECUTION ERROR: {str(e)}"
+
+    stdout, stderr = [], []
+    done = threading.Event()
+    readers = [
+        threading.Thread(
+            target=_drain, args=(process.stdout, stdout, log, done), daemon=True
+        ),
+        threading.Thread(
+            target=_drain, args=(process.stderr, stderr, False, done), daemon=True
+        ),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        _kill(process.pid, cgroup)
+
+    timer = threading.Timer(limits.wall_seconds, kill)
+    timer.start()
+    # wait4 rather than Popen.wait so the child's rusage is available
+    _, status, usage = os.wait4(process.pid, 0)
+    timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if not limits.allow_background:
+        _kill(process.pid, cgroup)
+    wall = time.perf_counter() - start
+    # Background processes may hold the pipes open; don't wait for them
+    deadline = time.monotonic() + 1
+    for reader in readers:
+        reader.join(timeout=max(0, deadline - time.monotonic()))
+    done.set()
+    background = limits.allow_background and _group_alive(process.pid)
+    if background:
+        _background[process.pid] = cgroup
+    else:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if cgroup is not None:
+            _remove_cgroup(cgroup)
+
+    cpu = usage.ru_utime + usage.ru_stime
+    notes = []
+    if timed_out.is_set():
+        notes.append(f"killed after {limits.wall_seconds}s wall time")
+    elif process.returncode != 0 and cpu >= limits.cpu_seconds - 0.5:
+        notes.append(f"CPU limit of {limits.cpu_seconds}s exceeded")
+    if background:
+        notes.append("background processes still running")
+    resources = (
+        f"RESOURCES: exit={process.returncode} wall={wall:.1f}s cpu={cpu:.1f}s "
+        f"max_rss={usage.ru_maxrss // 1024}MB "
+        f"isolated={'yes' if isolated else 'no'} "
+        f"pids={'cgroup' if cgroup is not None else 'rlimit'}"
+    )
+    if notes:
+        resources += f" ({'; '.join(notes)})"
+
+    full_output = "".join(stdout)
+    if process.returncode == 0:
+        return f"STDOUT:\n{full_output}\n{resources}"
+    else:
+        return (
+            f"STDERR:\n{''.join(stderr)}\nPARTIAL STDOUT:\n{full_output}\n{resources}"
+        )
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from pydantic_ai import ModelMessage
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.usage import RunUsage
+
+import tools
+from agent import AGENT_MODEL, _agent, planning_step
+from memo import MEMO
+from prefetch import PREFETCHER
+from ratelimit import scheduler_metrics
+from sandbox import Limits
+from usage import Budget, BudgetExceeded, UsageTracker
+
+
+def _restore(views: dict[Path, str], snapshot: dict[Path, str]) -> None:
+    # In place, since tools.VIEWS refers to the same dict
+    views.clear()
+    views.update(snapshot)
+
+
+@dataclass
+class Session:
+    """State of one hosted session; everything else is shared."""
+
+    name: str
+    kind: str
+    workspace: Path
+    tracker: UsageTracker
+    messages: list[ModelMessage] = field(default_factory=list)
+    # File contents as last shown to this session's model (see tools.VIEWS)
+    views: dict[Path, str] = field(default_factory=dict)
+    # Prompts to one session run one after another
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SessionServer:
+    """Hosts many independent planning/coding sessions on one event loop.
+
+    Sessions share the model clients and the file indexes cached by tools
+    (keyed by workspace path); each keeps its own message history, usage
+    tracker and workspace. Tools see the session's workspace through
+    tools.WORKSPACE, which is set per request task.
+
+    Requests and responses are JSON objects, one per line:
+        {"id": 1, "op": "create", "session": "a", "workspace": "proj", "kind": "coding"}
+        {"id": 2, "op": "prompt", "session": "a", "text": "..."}
+        {"id": 3, "op": "close", "session": "a"}
+        {"id": 4, "op": "list"}
+        {"id": 5, "op": "metrics"}
+    Every response echoes the request's "id".
+    """
+
+    def __init__(self, budget: Budget | None = None):
+        self.budget = budget or Budget()
+        self.sessions: dict[str, Session] = {}
+
+    async def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        try:
+            if op == "create":
+                return self.create(request)
+            elif op == "prompt":
+                return await self.prompt(request)
+            elif op == "close":
+                self.sessions.pop(request["session"])
+                return {"status": "closed"}
+            elif op == "list":
+                return {
+                    "sessions": {
+                        name: {
+                            "kind": s.kind,
+                            "workspace": str(s.workspace),
+                            "usage": s.tracker.summary(),
+                        }
+                        for name, s in self.sessions.items()
+                    }
+                }
+            elif op == "metrics":
+                return {
+                    "schedulers": scheduler_metrics(),
+                    "prefetch": PREFETCHER.stats(),
+                    "memo": MEMO.stats(),
+                }
+            return {"error": f"Unknown op: {op}"}
+        except KeyError as e:
+            return {"error": f"Missing or unknown {e}"}
+
+    def create(self, request: dict) -> dict:
+        name = request["session"]
+        if name in self.sessions:
+            return {"error": f"Session {name} already exists"}
+        kind = request.get("kind", "coding")
+        if kind not in ("planning", "coding"):
+            return {"error": f"Unknown session kind: {kind}"}
+        workspace = Path(request["workspace"]).resolve()
+        workspace.mkdir(parents=True, exist_ok=True)
+        self.sessions[name] = Session(
+            name, kind, workspace, UsageTracker(budget=self.budget)
+        )
+        return {"status": "created", "workspace": str(workspace)}
+
+    async def prompt(self, request: dict) -> dict:
+        session = self.sessions[request["session"]]
+        async with session.lock:
+            tools.WORKSPACE.set(session.workspace)
+            tools.VIEWS.set(session.views)
+            # A failed run's messages are dropped; so is what it showed the model
+            views = dict(session.views)
+            try:
+                session.tracker.check()
+                if session.kind == "planning":
+                    status, *output, new_messages = await planning_step(
+                        request["text"],
+                        session.messages,
+                        session.workspace,
+                        session.tracker,
+                    )
+                    output = output[0] if output else ""
+                else:
+                    limits = session.tracker.usage_limits(AGENT_MODEL)
+                    run_usage = RunUsage()
+                    try:
+                        result = await _agent.run(
+                            request["text"],
+                            message_history=session.messages,
+                            usage_limits=limits,
+                            usage=run_usage,
+                        )
+                    except UsageLimitExceeded:
+                        # Charge what the stopped run used
+                        session.tracker.record_stopped(AGENT_MODEL, run_usage, limits)
+                        raise
+                    session.tracker.record(AGENT_MODEL, result.usage())
+                    status, output = "done", result.output
+                    new_messages = result.new_messages()
+            except (BudgetExceeded, UsageLimitExceeded) as e:
+                _restore(session.views, views)
+                return {"status": "budget_exceeded", "error": str(e)}
+            except BaseException:
+                _restore(session.views, views)
+                raise
+            session.messages.extend(new_messages)
+            return {
+                "status": status,
+                "output": output,
+                "usage": session.tracker.summary(),
+            }
+
+    async def serve(self, reader: asyncio.StreamReader, write) -> None:
+        """Answer requests from `reader` concurrently until EOF."""
+        pending = set()
+
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"error": "Invalid JSON"}
+            else:
+                try:
+                    result = await self.handle(request)
+                except Exception as e:
+                    # One failing request must not take down the others
+                    result = {"error": f"{type(e).__name__}: {e}"}
+                response = {"id": request.get("id"), **result}
+            await write(json.dumps(response) + "\n")
+
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+
+async def serve_stdio(server: SessionServer) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+    out = sys.stdout
+    # Stray prints (e.g. from planning_step) must not corrupt the protocol
+    sys.stdout = sys.stderr
+
+    async def write(text: str):
+        out.write(text)
+        out.flush()
+
+    await server.serve(reader, write)
+
+
+async def serve_socket(server: SessionServer, path: Path) -> None:
+    async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+
+        async def write(text: str):
+            async with lock:
+                writer.write(text.encode())
+                await writer.drain()
+
+        await server.serve(reader, write)
+        writer.close()
+
+    path.unlink(missing_ok=True)
+    unix_server = await asyncio.start_unix_server(client, path=path)
+    print(f"Listening on {path}", file=sys.stderr)
+    async with unix_server:
+        await unix_server.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="server",
+        description="Host many agent sessions in one process.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="Listen on this Unix socket instead of stdin/stdout.",
+    )
+    parser.add_argument(
+        "--hard-budget",
+        type=float,
+        default=None,
+        help="Per-session cost limit in USD.",
+    )
+    parser.add_argument(
+        "--sandbox",
+        action="store_true",
+        help="Run agent commands with resource limits (see sandbox.py).",
+    )
+    args = parser.parse_args(argv)
+
+    if args.sandbox:
+        tools.SANDBOX = Limits()
+    server = SessionServer(Budget(hard_usd=args.hard_budget))
+    if args.socket is not None:
+        asyncio.run(serve_socket(server, args.socket))
+    else:
+        asyncio.run(serve_stdio(server))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
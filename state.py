@@ -0,0 +1,19 @@
+from pathlib import Path
+
+# Local state kept in a workspace (repo map, sessions, last green run, ...)
+STATE_DIR = ".selfheal"
+
+
+def make_state_dir(path: Path) -> None:
+    """Create `path` and keep the STATE_DIR it is in out of git.
+
+    Agents commit with `git add .`, so the state directory carries its own
+    .gitignore rather than relying on the project's.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    for directory in (path, *path.parents):
+        if directory.name == STATE_DIR:
+            ignore = directory / ".gitignore"
+            if not ignore.exists():
+                ignore.write_text("*\n")
+            return
@@ -1,13 +1,71 @@
+import difflib
 import glob
+import json
+import os
 import shlex
 import subprocess
+from contextvars import ContextVar
+from pathlib import Path
 
+from ledger import FEATURE_LIST, get_ledger
+from memo import MEMO, tracked
+from prefetch import PREFETCHER
+from repomap import get_repo_map
+from sandbox import Limits, limits_from_env, run_sandboxed
+from verify import load_mapping, run_verification, save_mapping, summarize
 
-def _run_process_streaming(command, cwd=".", log=False):
+# When set, commands run under these resource limits (see sandbox.py). Child
+# processes such as orchestrator sessions enable it via SELFHEAL_SANDBOX.
+SANDBOX: Limits | None = limits_from_env()
+
+# Directory relative paths and commands are resolved against. A context
+# variable so that concurrent sessions in one process (see server.py) each
+# see their own workspace.
+WORKSPACE: ContextVar[Path] = ContextVar("workspace", default=Path("."))
+
+
+# File contents as the model last saw them, per session. While set,
+# repeated reads return a diff against that view instead of the whole file.
+VIEWS: ContextVar[dict[Path, str] | None] = ContextVar("views", default=None)
+
+
+def _resolve(filepath: str) -> Path:
+    return WORKSPACE.get() / filepath
+
+
+def _since_last_view(path: Path, content: str, full: bool) -> str:
+    views = VIEWS.get()
+    if views is None:
+        return content
+    key = path.resolve()
+    previous = views.get(key)
+    views[key] = content
+    if full or previous is None:
+        return content
+    if previous == content:
+        return "[Unchanged since your last read. Use full=True to see it again.]"
+    diff = "".join(
+        difflib.unified_diff(
+            previous.splitlines(keepends=True),
+            content.splitlines(keepends=True),
+            fromfile="last read",
+            tofile="now",
+        )
+    )
+    if len(diff) >= len(content):
+        return content
+    return f"[Changed since your last read; unified diff follows. Use full=True for the whole file.]\n{diff}"
+
+
+def _run_process_streaming(command, cwd=None, log=False):
     """
     Runs a command and streams output in real-time to the console,
     while capturing it to return to the LLM.
     """
+    cwd = cwd or WORKSPACE.get()
+    if SANDBOX is not None:
+        return run_sandboxed(command, cwd, SANDBOX, log)
+
     try:
         process = subprocess.Popen(
             command,
@@ -46,11 +104,17 @@ def _run_process_streaming(command, cwd=".", log=False):
         return f"EXECUTION ERROR: {str(e)}"
 
 
-def read(filepath: str):
-    """Reads a file"""
+def read(filepath: str, full: bool = False):
+    """Reads a file.
+
+    Re-reading a file returns only a diff against the version you last saw
+    (or a note that it is unchanged); set full=True for the whole file.
+    """
     try:
-        with open(filepath, "r") as f:
-            return f.read()
+        path = _resolve(filepath)
+        content = PREFETCHER.read(path)
+        PREFETCHER.observe_read(path, content, WORKSPACE.get())
+        return _since_last_view(path, content, full)
     except FileNotFoundError:
         return "Error: File not found."
     except Exception as e:
@@ -64,24 +128,71 @@ def search(pattern: str, filepath: str, flags: str = "-n"):
     safe_pattern = shlex.quote(pattern)
     safe_path = shlex.quote(filepath)
     cmd = f"grep {flags} {safe_pattern} {safe_path}"
-    return _run_process_streaming(cmd)
+
+    def run():
+        output = _run_process_streaming(cmd)
+        PREFETCHER.observe_output(output, WORKSPACE.get())
+        return output
+
+    if not tracked(WORKSPACE.get(), Path(filepath)):
+        return run()
+    args = (pattern, os.path.normpath(filepath), " ".join(sorted(flags.split())))
+    # Without recursion, only the named file's own stamp matters
+    recursive = any(
+        flag in ("--recursive", "--dereference-recursive")
+        or (flag[:1] == "-" and flag[1:2] != "-" and set(flag) & {"r", "R"})
+        for flag in flags.split()
+    )
+    return MEMO.call(
+        "search",
+        WORKSPACE.get(),
+        args,
+        run,
+        scope=_resolve(filepath),
+        max_depth=None if recursive else 0,
+    )
+
+
+def _guard_feature_list(path: Path) -> str | None:
+    """Refusal to change an existing feature list other than via mark_feature."""
+    if path.resolve() == (WORKSPACE.get() / FEATURE_LIST).resolve() and path.exists():
+        return (
+            f"Error: {FEATURE_LIST} can't be edited directly. "
+            "Use mark_feature to set a feature's passes flag."
+        )
+    return None
 
 
 def edit(find: str, replace: str, filepath: str):
     """Replace text in a file using sed."""
+    error = _guard_feature_list(_resolve(filepath))
+    if error:
+        return error
     safe_find = find.replace("/", "\\/")
     safe_replace = replace.replace("/", "\\/")
     safe_path = shlex.quote(filepath)
 
     cmd = f"sed -i 's/{safe_find}/{safe_replace}/g' {safe_path}"
-    return _run_process_streaming(cmd)
+    try:
+        return _run_process_streaming(cmd)
+    finally:
+        MEMO.bump(WORKSPACE.get())
 
 
 def write(content: str, filepath: str):
     """Writes content to a file (overwrites if exists)."""
     try:
-        with open(filepath, "w") as f:
+        path = _resolve(filepath)
+        error = _guard_feature_list(path)
+        if error:
+            return error
+        with open(path, "w") as f:
             f.write(content)
+        MEMO.bump(WORKSPACE.get())
+        views = VIEWS.get()
+        if views is not None:
+            # The model knows exactly what it wrote
+            views[path.resolve()] = content
         return f"Successfully wrote to {filepath}"
     except Exception as e:
         return f"Error writing file: {str(e)}"
@@ -89,7 +200,13 @@ def write(content: str, filepath: str):
 
 def execute(command: str):
     """Executes a raw bash command."""
-    return _run_process_streaming(command)
+    try:
+        output = _run_process_streaming(command)
+    finally:
+        # Commands may change any file
+        MEMO.bump(WORKSPACE.get())
+    PREFETCHER.observe_output(output, WORKSPACE.get())
+    return output
 
 
 def glob_files(pattern: str, recursive: bool = False):
@@ -100,12 +217,160 @@ def glob_files(pattern: str, recursive: bool = False):
         - Hidden files are excluded by default for security/brevity.
     """
     safe_pattern = shlex.quote(pattern)
-    files = glob.iglob(safe_pattern, recursive=recursive, include_hidden=False)
-    ignored_dirs = {".git", ".venv", "node_modules", "__pycache__"}
 
-    results = []
-    for f in files:
-        if not any(ignored in f for ignored in ignored_dirs):
-            results.append(f)
+    def run():
+        files = glob.iglob(
+            safe_pattern,
+            root_dir=WORKSPACE.get(),
+            recursive=recursive,
+            include_hidden=False,
+        )
+        ignored_dirs = {".git", ".venv", "node_modules", "__pycache__"}
+
+        results = []
+        for f in files:
+            if not any(ignored in f for ignored in ignored_dirs):
+                results.append(f)
+        return results
+
+    if not tracked(WORKSPACE.get(), Path(pattern)):
+        return run()
+    # The directory before the first wildcard, as deep as the pattern reaches
+    parts = Path(pattern).parts
+    fixed = 0
+    while fixed < len(parts) and not glob.has_magic(parts[fixed]):
+        fixed += 1
+    depth = None if recursive and "**" in parts else len(parts) - fixed
+    return list(
+        MEMO.call(
+            "glob_files",
+            WORKSPACE.get(),
+            (pattern, recursive),
+            run,
+            scope=_resolve(os.path.join(*parts[:fixed]) if fixed else "."),
+            max_depth=depth,
+        )
+    )
+
 
-    return results
+def feature_status():
+    """Counts of passing/failing features in feature_list.json, overall and by category.
+
+    Use this instead of reading or grepping feature_list.json.
+    """
+    try:
+        return json.dumps(get_ledger(WORKSPACE.get()).counts())
+    except FileNotFoundError:
+        return "Error: feature_list.json not found."
+
+
+def next_feature(category: str = ""):
+    """Returns the highest-priority feature that does not pass yet, with its index.
+
+    Optionally restrict to a category such as "functional" or "style".
+    """
+    try:
+        ledger = get_ledger(WORKSPACE.get())
+    except FileNotFoundError:
+        return "Error: feature_list.json not found."
+    index = ledger.next_failing(category or None)
+    if index is None:
+        return "All features pass."
+    return json.dumps({"index": index, **ledger.features[index]}, indent=2)
+
+
+def mark_feature(index: int, passes: bool = True):
+    """Sets the "passes" flag of feature #index in feature_list.json.
+
+    This is the only allowed change to feature_list.json. Only mark a feature
+    passing after verifying it end-to-end.
+    """
+    try:
+        get_ledger(WORKSPACE.get()).set_passes(index, passes)
+        MEMO.bump(WORKSPACE.get())
+        return f"Feature #{index} marked as {'passing' if passes else 'failing'}."
+    except FileNotFoundError:
+        return "Error: feature_list.json not found."
+    except IndexError as e:
+        return f"Error: {e}"
+
+
+def set_feature_test(
+    index: int, command: str, paths: list[str] | None = None, serial: bool = False
+):
+    """Registers the shell command that verifies feature #index.
+
+    `paths` lists the files or directory prefixes the feature depends on;
+    its test only re-runs when one of them changes. Without paths the test
+    always runs. Tests run in parallel in the same directory; set
+    serial=True if this one uses a fixed port, database or other shared
+    files.
+    """
+    try:
+        ledger = get_ledger(WORKSPACE.get())
+    except FileNotFoundError:
+        return "Error: feature_list.json not found."
+    if not 0 <= index < len(ledger.features):
+        return f"Error: No feature #{index}"
+    mapping = load_mapping(WORKSPACE.get())
+    mapping[index] = {"command": command, "paths": paths or []}
+    if serial:
+        mapping[index]["serial"] = True
+    save_mapping(mapping, WORKSPACE.get())
+    MEMO.bump(WORKSPACE.get())
+    return f"Registered test for feature #{index}: {command}"
+
+
+def verify_features(run_all: bool = False):
+    """Re-runs the tests of passing features in parallel and summarizes the results.
+
+    Only features affected by changes since their last green run are tested,
+    unless run_all=True.
+    """
+    try:
+        return summarize(*run_verification(WORKSPACE.get(), run_all=run_all))
+    except FileNotFoundError:
+        return "Error: feature_list.json not found."
+    finally:
+        # Tests may write files
+        MEMO.bump(WORKSPACE.get())
+
+
+def repo_map(max_tokens: int = 2000):
+    """Returns a map of the workspace: files with their classes, functions and signatures.
+
+    Files and symbols are ranked by how often they are referenced elsewhere
+    and the map is cut to roughly max_tokens. Use this to orient yourself
+    before reading individual files.
+    """
+    return get_repo_map(WORKSPACE.get()).render(max_tokens)
+
+
+def find_definition(name: str):
+    """Finds where a function, class or method is defined, e.g. "planning_step" or "RepoMap.refresh".
+
+    Returns exact file:line locations with the signature and a few lines of code.
+    """
+    index = get_repo_map(WORKSPACE.get())
+    definitions = index.definitions(name)
+    if not definitions:
+        return f"No definition of {name} found."
+    return "\n\n".join(
+        f"{rel}:{line} ({kind} {full_name})\n{index.snippet(rel, line, 2)}"
+        for rel, (kind, full_name, signature, line) in definitions
+    )
+
+
+def find_references(name: str, limit: int = 50):
+    """Finds every line that uses a name (exact identifier match, definitions excluded).
+
+    Returns file:line locations with the matching line, at most `limit` of them.
+    """
+    index = get_repo_map(WORKSPACE.get())
+    references = index.references(name)
+    if not references:
+        return f"No references to {name} found."
+    lines = [f"{rel}:{index.snippet(rel, line)}" for rel, line in references[:limit]]
+    if len(references) > limit:
+        lines.append(f"... {len(references) - limit} more references")
+    return "\n".join(lines)
@@ -0,0 +1,186 @@
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from pydantic_ai.usage import RunUsage, UsageLimits
+
+# USD per 1M tokens: (input, cached input, output).
+# Estimates only; unknown models are counted at the default rate.
+MODEL_PRICES = {
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "claude-3-opus": (15.00, 1.50, 75.00),
+    "claude-3-sonnet": (3.00, 0.30, 15.00),
+    "claude-3-haiku": (0.25, 0.03, 1.25),
+    "gemini-3-flash-preview": (0.50, 0.05, 3.00),
+}
+DEFAULT_PRICE = (1.00, 0.10, 4.00)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a session goes over its hard budget."""
+
+
+def _model_name(model: str) -> str:
+    # "openai:gpt-5-mini" -> "gpt-5-mini"
+    return model.split(":", 1)[-1]
+
+
+def estimate_cost(model: str, usage: RunUsage) -> float:
+    """Estimate the USD cost of `usage` on `model`."""
+    input_price, cached_price, output_price = MODEL_PRICES.get(
+        _model_name(model), DEFAULT_PRICE
+    )
+    uncached = max(usage.input_tokens - usage.cache_read_tokens, 0)
+    return (
+        uncached * input_price
+        + usage.cache_read_tokens * cached_price
+        + usage.output_tokens * output_price
+    ) / 1_000_000
+
+
+@dataclass
+class Budget:
+    """Soft limits warn, hard limits stop the agent. None means unlimited."""
+
+    soft_usd: Optional[float] = None
+    hard_usd: Optional[float] = None
+    soft_tokens: Optional[int] = None
+    hard_tokens: Optional[int] = None
+
+
+@dataclass
+class UsageTotals:
+    requests: int = 0
+    tool_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, usage: RunUsage, cost: float) -> None:
+        self.requests += usage.requests
+        self.tool_calls += usage.tool_calls
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cached_tokens += usage.cache_read_tokens
+        self.cost_usd += cost
+
+
+@dataclass
+class UsageTracker:
+    """Accumulates usage per turn, per model and per session."""
+
+    budget: Budget = field(default_factory=Budget)
+    session: UsageTotals = field(default_factory=UsageTotals)
+    per_model: dict[str, UsageTotals] = field(default_factory=dict)
+    turns: list[dict] = field(default_factory=list)
+
+    def record(self, model: str, usage: RunUsage) -> UsageTotals:
+        """Record the usage of one agent run (a turn and its tool-call loop)."""
+        cost = estimate_cost(model, usage)
+        turn = UsageTotals()
+        turn.add(usage, cost)
+        self.session.add(usage, cost)
+        self.per_model.setdefault(_model_name(model), UsageTotals()).add(usage, cost)
+        self.turns.append({"model": _model_name(model), **asdict(turn)})
+        return turn
+
+    def record_stopped(
+        self, model: str, usage: RunUsage, limits: UsageLimits | None
+    ) -> UsageTotals:
+        """Record a run that `limits` stopped partway, given its `usage=` object.
+
+        A streamed run stops before its last response is counted, but it used
+        at least the token limit, so it is charged at least that.
+        """
+        limit = limits.total_tokens_limit if limits is not None else None
+        if limit is not None and usage.total_tokens < limit:
+            usage.input_tokens += limit - usage.total_tokens
+        return self.record(model, usage)
+
+    def status(self) -> str:
+        """Return "ok", "warn" or "stop" for the current session totals."""
+        b, s = self.budget, self.session
+        if (b.hard_usd is not None and s.cost_usd >= b.hard_usd) or (
+            b.hard_tokens is not None and s.total_tokens >= b.hard_tokens
+        ):
+            return "stop"
+        if (b.soft_usd is not None and s.cost_usd >= b.soft_usd) or (
+            b.soft_tokens is not None and s.total_tokens >= b.soft_tokens
+        ):
+            return "warn"
+        return "ok"
+
+    def check(self) -> str:
+        """Like `status`, but raises BudgetExceeded once the hard budget is hit."""
+        status = self.status()
+        if status == "stop":
+            raise BudgetExceeded(
+                f"Session budget exhausted: {self.session.total_tokens} tokens, "
+                f"${self.session.cost_usd:.4f}"
+            )
+        return status
+
+    def usage_limits(self, model: str | None = None) -> UsageLimits | None:
+        """UsageLimits that stop a single run at the remaining hard budget.
+
+        Runs only report tokens, so a hard USD budget becomes a token cap at
+        `model`'s highest per-token price. That never overspends but may
+        stop a run early; the exact cost is checked between runs.
+        """
+        caps = []
+        if self.budget.hard_tokens is not None:
+            caps.append(self.budget.hard_tokens - self.session.total_tokens)
+        if self.budget.hard_usd is not None and model is not None:
+            price = max(MODEL_PRICES.get(_model_name(model), DEFAULT_PRICE))
+            remaining_usd = self.budget.hard_usd - self.session.cost_usd
+            caps.append(int(remaining_usd * 1_000_000 / price))
+        if not caps:
+            return None
+        return UsageLimits(total_tokens_limit=max(min(caps), 0))
+
+    def summary(self) -> str:
+        """Short summary for panel titles."""
+        s = self.session
+        text = (
+            f"{s.total_tokens:,} tok ({s.cached_tokens:,} cached) · "
+            f"{s.requests} req · ${s.cost_usd:.4f}"
+        )
+        if self.budget.hard_usd is not None:
+            text += f" / ${self.budget.hard_usd:.2f}"
+        return text
+
+    def to_dict(self) -> dict:
+        return {
+            "budget": asdict(self.budget),
+            "session": asdict(self.session),
+            "per_model": {k: asdict(v) for k, v in self.per_model.items()},
+            "turns": self.turns,
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+
+    @classmethod
+    def load(cls, path: Path, budget: Budget | None = None) -> "UsageTracker":
+        """Load a saved tracker; limits set in `budget` override saved ones."""
+        data = json.loads(path.read_text())
+        saved = asdict(Budget(**data["budget"]))
+        if budget is not None:
+            saved.update((k, v) for k, v in asdict(budget).items() if v is not None)
+        tracker = cls(
+            budget=Budget(**saved),
+            session=UsageTotals(**data["session"]),
+            per_model={k: UsageTotals(**v) for k, v in data["per_model"].items()},
+            turns=data["turns"],
+        )
+        return tracker
@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from ledger import get_ledger
+from state import STATE_DIR, make_state_dir
+
+# Maps feature index -> {"command": ..., "paths": [...], "serial": bool};
+# lives in the project
+VERIFICATION_FILE = "verification.json"
+# Commit each feature last verified green at; local state, not committed
+GREEN_STATE = Path(STATE_DIR) / "last_green.json"
+
+TIMEOUT = 300
+# Tests share the project directory (only TMPDIR is per test), so files,
+# databases or ports they create can collide; keep parallelism modest.
+MAX_PARALLEL = min(4, os.cpu_count() or 1)
+OUTPUT_TAIL = 20
+
+
+@dataclass
+class VerificationResult:
+    feature: int
+    command: str
+    passed: bool
+    seconds: float
+    output: str = ""
+
+
+def load_mapping(project_dir: Path = Path(".")) -> dict[int, dict]:
+    path = project_dir / VERIFICATION_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+
+def save_mapping(mapping: dict[int, dict], project_dir: Path = Path(".")) -> None:
+    with open(project_dir / VERIFICATION_FILE, "w") as f:
+        json.dump({str(k): v for k, v in sorted(mapping.items())}, f, indent=2)
+        f.write("\n")
+
+
+def _git(*args: str, cwd: Path) -> str | None:
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+def changed_files(since: str, project_dir: Path) -> set[str] | None:
+    """Files changed since commit `since`, including uncommitted ones.
+
+    Returns None when the diff cannot be computed (e.g. unknown commit).
+    """
+    committed = _git("diff", "--name-only", since, cwd=project_dir)
+    if committed is None:
+        return None
+    untracked = _git("ls-files", "--others", "--exclude-standard", cwd=project_dir)
+    return set(committed.split()) | set((untracked or "").split())
+
+
+def is_affected(spec: dict, changed: set[str] | None) -> bool:
+    """Whether a feature's test must run given the changed files.
+
+    Features without "paths" are always run, as is everything when the diff
+    is unknown.
+    """
+    paths = spec.get("paths")
+    if changed is None or not paths:
+        return True
+    if VERIFICATION_FILE in changed:
+        return True
+    return any(file.startswith(prefix) for file in changed for prefix in paths)
+
+
+def _run_one(feature: int, command: str, project_dir: Path) -> VerificationResult:
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix=f"verify-{feature}-") as tmp:
+        env = {**os.environ, "TMPDIR": tmp, "TMP": tmp, "TEMP": tmp}
+        try:
+            result = subprocess.run(
+                command,
+                shell=True,
+                cwd=project_dir,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=TIMEOUT,
+            )
+            passed = result.returncode == 0
+            output = result.stdout + result.stderr
+        except subprocess.TimeoutExpired:
+            passed, output = False, f"Timed out after {TIMEOUT}s"
+    tail = "\n".join(output.strip().splitlines()[-OUTPUT_TAIL:])
+    return VerificationResult(
+        feature, command, passed, time.perf_counter() - start, tail
+    )
+
+
+def run_verification(
+    project_dir: Path = Path("."), run_all: bool = False
+) -> tuple[list[VerificationResult], list[int]]:
+    """Run the tests of passing features affected by changes since they were green.
+
+    Tests run in the project directory, at most MAX_PARALLEL at a time, with
+    a private TMPDIR each; "serial" tests run afterwards one at a time.
+    Returns (results, skipped feature indexes).
+    """
+    ledger = get_ledger(project_dir)
+    mapping = load_mapping(project_dir)
+    green_path = project_dir / GREEN_STATE
+    green = json.loads(green_path.read_text()) if green_path.exists() else {}
+    head = (_git("rev-parse", "HEAD", cwd=project_dir) or "").strip()
+
+    diffs: dict[str, set[str] | None] = {}
+    selected, skipped = [], []
+    for index, spec in mapping.items():
+        if index >= len(ledger.features) or not ledger.features[index].get("passes"):
+            continue
+        since = green.get(str(index))
+        if not run_all and since is not None:
+            if since not in diffs:
+                diffs[since] = changed_files(since, project_dir)
+            if not is_affected(spec, diffs[since]):
+                skipped.append(index)
+                continue
+        selected.append((index, spec))
+
+    # Tests marked "serial" (fixed ports, shared databases, ...) run alone
+    parallel = [(i, spec["command"]) for i, spec in selected if not spec.get("serial")]
+    serial = [(i, spec["command"]) for i, spec in selected if spec.get("serial")]
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as pool:
+        results = list(pool.map(lambda item: _run_one(*item, project_dir), parallel))
+    results += [_run_one(*item, project_dir) for item in serial]
+
+    for result in results:
+        if result.passed and head:
+            green[str(result.feature)] = head
+        else:
+            green.pop(str(result.feature), None)
+    make_state_dir(green_path.parent)
+    green_path.write_text(json.dumps(green, indent=2))
+
+    return results, skipped
+
+
+def summarize(results: list[VerificationResult], skipped: list[int]) -> str:
+    passed = [r for r in results if r.passed]
+    lines = [
+        f"Verified {len(results)} features: {len(passed)} passed, "
+        f"{len(results) - len(passed)} failed, {len(skipped)} skipped (unaffected)."
+    ]
+    for r in results:
+        if not r.passed:
+            lines.append(f"\n✗ Feature #{r.feature} ({r.command}, {r.seconds:.1f}s):")
+            lines.append(r.output)
+    return "\n".join(lines)